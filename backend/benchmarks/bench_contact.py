@@ -0,0 +1,299 @@
+"""End-to-end load benchmark for POST /api/contact.
+
+Drives the FastAPI app either in-process over an ASGI transport or through
+real uvicorn workers, with a stub Ollama server standing in for the LLM.
+Reports req/s and p50/p95/p99 latency overall and per stage (taken from the
+Server-Timing header), sweeps concurrency levels, and writes the results as
+JSON so runs can be compared across commits.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_contact --concurrency 1,8,32 --requests 300
+    python -m benchmarks.bench_contact --mode uvicorn --workers 4
+    python -m benchmarks.bench_contact --backend all --dynamodb-endpoint http://localhost:8001
+    python -m benchmarks.bench_contact --compare benchmarks/results/<previous>.json
+
+The postgres backend uses the POSTGRES_* settings (point them at a local
+server); the dynamodb backend needs a DynamoDB Local / LocalStack endpoint.
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+import httpx
+
+from benchmarks.stub_ollama import StubOllama, StubOllamaServer
+
+RESULTS_DIR = os.path.join(BACKEND_DIR, "benchmarks", "results")
+BACKENDS = ("memory", "postgres", "dynamodb")
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0}
+    ordered = sorted(values)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+    return {"p50": round(pick(0.50), 3), "p95": round(pick(0.95), 3), "p99": round(pick(0.99), 3)}
+
+def parse_server_timing(header: Optional[str]) -> Dict[str, float]:
+    timings = {}
+    for entry in (header or "").split(","):
+        name, _, duration = entry.strip().partition(";dur=")
+        if name and duration:
+            timings[name] = float(duration)
+    return timings
+
+def app_environment(args, backend: str, ollama_url: str) -> Dict[str, str]:
+    """Settings for the app under test (read by config.Settings at import)"""
+    env = {
+        "DATABASE_TYPE": backend,
+        "OLLAMA_HOST": ollama_url,
+        "SERVER_TIMING_ENABLED": "true",
+        "RATE_LIMIT_ENABLED": "false",
+        "EMAIL_NOTIFICATIONS_ENABLED": "false",
+        # Hermetic runs: no DNS lookup of the (reserved) benchmark email domain
+        "EMAIL_CHECK_DELIVERABILITY": "false",
+        "LOG_LEVEL": "WARNING",
+    }
+    if args.dynamodb_endpoint:
+        env["DYNAMODB_ENDPOINT_URL"] = args.dynamodb_endpoint
+        env.setdefault("AWS_ACCESS_KEY_ID", os.environ.get("AWS_ACCESS_KEY_ID", "local"))
+        env.setdefault("AWS_SECRET_ACCESS_KEY", os.environ.get("AWS_SECRET_ACCESS_KEY", "local"))
+    return env
+
+def contact_payload(args) -> dict:
+    # Unique email and message so idempotency deduplication never short-circuits the path
+    token = uuid.uuid4().hex[:12]
+    return {
+        "fullName": "Bench Mark",
+        "email": f"bench-{token}@{args.email_domain}",
+        "countryCode": "FR",
+        "message": f"Benchmark submission {token}. " + "Looking forward to hearing from you. " * args.message_repeat,
+    }
+
+async def run_level(client: httpx.AsyncClient, args, concurrency: int) -> dict:
+    """Run one concurrency level; only 2xx responses count towards req/s and latency"""
+    latencies: List[float] = []
+    stages: Dict[str, List[float]] = {}
+    statuses: Dict[str, int] = {}
+    remaining = args.requests
+    
+    async def worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            start = time.perf_counter()
+            try:
+                response = await client.post("/api/contact", json=contact_payload(args))
+                status = str(response.status_code)
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+                response = None
+            statuses[status] = statuses.get(status, 0) + 1
+            if response is not None and response.is_success:
+                latencies.append((time.perf_counter() - start) * 1000)
+                for name, duration in parse_server_timing(response.headers.get("server-timing")).items():
+                    stages.setdefault(name, []).append(duration)
+    
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    
+    failed = args.requests - len(latencies)
+    if failed:
+        print(
+            f"  WARNING: c={concurrency}: {failed} of {args.requests} requests did not succeed {statuses}; "
+            "they are excluded from req/s and latency",
+            file=sys.stderr
+        )
+    if not latencies:
+        raise RuntimeError(f"No successful requests at c={concurrency} ({statuses}); nothing to measure")
+    
+    return {
+        "concurrency": concurrency,
+        "requests": args.requests,
+        "failed": failed,
+        "statuses": statuses,
+        "rps": round(len(latencies) / elapsed, 2),
+        "latency_ms": percentiles(latencies),
+        "stages_ms": {name: percentiles(values) for name, values in sorted(stages.items())},
+    }
+
+async def sweep(client: httpx.AsyncClient, args) -> List[dict]:
+    # Warm-up pass so connection setup and first-call costs are not measured
+    await asyncio.gather(*(client.post("/api/contact", json=contact_payload(args)) for _ in range(args.warmup)))
+    levels = []
+    for concurrency in args.concurrency:
+        result = await run_level(client, args, concurrency)
+        print(
+            f"  c={concurrency:<4} {result['rps']:>9.1f} req/s  "
+            f"p50={result['latency_ms']['p50']}ms p95={result['latency_ms']['p95']}ms "
+            f"p99={result['latency_ms']['p99']}ms  {result['statuses']}",
+            file=sys.stderr
+        )
+        levels.append(result)
+    return levels
+
+async def bench_asgi(args, env: Dict[str, str]) -> List[dict]:
+    os.environ.update(env)
+    import main  # Imported here so the environment above is picked up by Settings
+    
+    await main.app.router.startup()
+    try:
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+            return await sweep(client, args)
+    finally:
+        await main.app.router.shutdown()
+
+async def bench_uvicorn(args, env: Dict[str, str]) -> List[dict]:
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(args.workers), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env={**os.environ, **env}
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        limits = httpx.Limits(max_connections=max(args.concurrency), max_keepalive_connections=max(args.concurrency))
+        async with httpx.AsyncClient(base_url=base_url, timeout=60, limits=limits) as client:
+            deadline = time.monotonic() + 60
+            while True:
+                try:
+                    if (await client.get("/health")).status_code == 200:
+                        break
+                except httpx.TransportError:
+                    pass
+                if time.monotonic() > deadline or process.poll() is not None:
+                    raise RuntimeError("uvicorn did not become healthy")
+                await asyncio.sleep(0.2)
+            return await sweep(client, args)
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+def run_backend(args, backend: str) -> dict:
+    stub = StubOllama(args.ollama_latency, args.ollama_jitter, args.ollama_error_rate, args.ollama_verbosity)
+    with StubOllamaServer(stub, free_port()) as ollama:
+        env = app_environment(args, backend, ollama.url)
+        print(f"[{args.mode}] backend={backend} ollama={ollama.url}", file=sys.stderr)
+        runner = bench_asgi if args.mode == "asgi" else bench_uvicorn
+        levels = asyncio.run(runner(args, env))
+    return {"backend": backend, "ollama_requests": stub.requests, "levels": levels}
+
+def run_backend_isolated(args, backend: str) -> dict:
+    """Run one backend in a child process so each gets a fresh app and settings"""
+    command = [sys.executable, "-m", "benchmarks.bench_contact", "--child", "--backend", backend]
+    for name in ("mode", "workers", "requests", "warmup", "email_domain", "message_repeat",
+                 "ollama_latency", "ollama_jitter", "ollama_error_rate", "ollama_verbosity", "dynamodb_endpoint"):
+        value = getattr(args, name)
+        if value not in (None, ""):
+            command += [f"--{name.replace('_', '-')}", str(value)]
+    command += ["--concurrency", ",".join(map(str, args.concurrency))]
+    completed = subprocess.run(command, cwd=BACKEND_DIR, stdout=subprocess.PIPE, text=True)
+    if completed.returncode != 0:
+        return {"backend": backend, "error": f"benchmark exited with status {completed.returncode}"}
+    return json.loads(completed.stdout)
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, text=True, stderr=subprocess.DEVNULL
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def compare(current: dict, previous_path: str):
+    with open(previous_path, encoding="utf-8") as f:
+        previous = json.load(f)
+    before = {
+        (run["backend"], level["concurrency"]): level
+        for run in previous["runs"] for level in run.get("levels", [])
+    }
+    print(f"\nComparison with {previous.get('commit')} ({previous_path}):")
+    for run in current["runs"]:
+        for level in run.get("levels", []):
+            old = before.get((run["backend"], level["concurrency"]))
+            if not old:
+                continue
+            rps_change = (level["rps"] / old["rps"] - 1) * 100 if old["rps"] else 0.0
+            p95_change = level["latency_ms"]["p95"] - old["latency_ms"]["p95"]
+            print(
+                f"  {run['backend']:<9} c={level['concurrency']:<4} "
+                f"req/s {old['rps']:>9.1f} -> {level['rps']:>9.1f} ({rps_change:+.1f}%)  "
+                f"p95 {old['latency_ms']['p95']:>8.1f} -> {level['latency_ms']['p95']:>8.1f} ms ({p95_change:+.1f})"
+            )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mode", choices=("asgi", "uvicorn"), default="asgi")
+    parser.add_argument("--workers", type=int, default=2, help="uvicorn workers (uvicorn mode)")
+    parser.add_argument("--backend", default="memory", help=f"One of {', '.join(BACKENDS)}, a comma list, or 'all'")
+    parser.add_argument("--concurrency", default="1,8,32", help="Comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per concurrency level")
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--email-domain", default="example.com")
+    parser.add_argument("--message-repeat", type=int, default=5, help="Controls the message size")
+    parser.add_argument("--ollama-latency", type=float, default=0.2)
+    parser.add_argument("--ollama-jitter", type=float, default=0.05)
+    parser.add_argument("--ollama-error-rate", type=float, default=0.0)
+    parser.add_argument("--ollama-verbosity", type=int, default=1)
+    parser.add_argument("--dynamodb-endpoint", default="", help="DynamoDB Local / LocalStack URL")
+    parser.add_argument("--output", default=RESULTS_DIR, help="Directory for the JSON result file")
+    parser.add_argument("--compare", help="Previous result file to compare against")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    args.concurrency = [int(level) for level in str(args.concurrency).split(",")]
+    
+    if args.child:
+        print(json.dumps(run_backend(args, args.backend)))
+        return
+    
+    backends = list(BACKENDS) if args.backend == "all" else args.backend.split(",")
+    if len(backends) == 1:
+        runs = [run_backend(args, backends[0])]
+    else:
+        runs = [run_backend_isolated(args, backend) for backend in backends]
+    
+    result = {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "mode": args.mode,
+        "workers": args.workers if args.mode == "uvicorn" else 1,
+        "ollama": {
+            "latency": args.ollama_latency,
+            "jitter": args.ollama_jitter,
+            "error_rate": args.ollama_error_rate,
+            "verbosity": args.ollama_verbosity,
+        },
+        "runs": runs,
+    }
+    
+    os.makedirs(args.output, exist_ok=True)
+    path = os.path.join(
+        args.output, f"contact_{datetime.now(timezone.utc):%Y%m%dT%H%M%S}_{result['commit']}_{args.mode}.json"
+    )
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    print(f"Results written to {path}")
+    
+    if args.compare:
+        compare(result, args.compare)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Benchmark GET /api/contacts: bytes and CPU per page, before and after.
+
+"before" serves the page the way the endpoint used to, through FastAPI's
+generic jsonable_encoder and the stdlib JSON encoder; the other variants
+go through the orjson response, with and without a fields= projection and
+gzip. Requests are made in-process over an ASGI transport against the
+memory backend, so the numbers are serialization and framework cost only.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_contact_listing [--contacts 2000] [--page-size 100] [--pages 200]
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+PROJECTION = "id,full_name,email,created_at"
+
+VOCABULARY = (
+    "we would like a quote for our team project website design coffee event next month "
+    "please call me about pricing availability delivery support thanks regards hello "
+    "interested order services company meeting schedule budget timeline question"
+).split()
+
+async def populate(db_service, count: int):
+    rng = random.Random(42)
+    for i in range(count):
+        # Varied text so compression ratios resemble real messages (roughly 500 to 5000 characters)
+        words = [rng.choice(VOCABULARY) for _ in range(rng.randint(70, 700))]
+        await db_service.create_contact({
+            "full_name": f"Contact {i}",
+            "email": f"contact{i}@example.org",
+            "phone_number": "+33612345678",
+            "country_code": "FR",
+            "message": " ".join(words),
+        })
+
+def add_legacy_route(main):
+    """The listing endpoint as it was before orjson and projection"""
+    @main.app.get("/bench/legacy-contacts")
+    async def legacy_contacts(limit: int = 100, offset: int = 0):
+        contacts = await main.db_service.list_contacts(limit=limit, offset=offset)
+        return {"success": True, "contacts": contacts, "count": len(contacts)}
+
+async def measure(client: httpx.AsyncClient, path: str, params: dict, gzip: bool, pages: int) -> dict:
+    headers = {"Accept-Encoding": "gzip" if gzip else "identity"}
+    # Warm-up so route resolution and first-call costs are not measured
+    for _ in range(5):
+        await client.get(path, params=params, headers=headers)
+    
+    wire_bytes = 0
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    for _ in range(pages):
+        response = await client.get(path, params=params, headers=headers)
+        response.raise_for_status()
+        wire_bytes = response.num_bytes_downloaded
+    return {
+        "bytes": wire_bytes,
+        "cpu_ms": (time.process_time() - cpu_start) * 1000 / pages,
+        "wall_ms": (time.perf_counter() - wall_start) * 1000 / pages,
+    }
+
+async def run(args):
+    os.environ.update({
+        "DATABASE_TYPE": "memory",
+        "RATE_LIMIT_ENABLED": "false",
+        "EMAIL_NOTIFICATIONS_ENABLED": "false",
+        "LOG_LEVEL": "WARNING",
+    })
+    import main  # Imported here so the environment above is picked up by Settings
+    
+    add_legacy_route(main)
+    await main.app.router.startup()
+    try:
+        await populate(main.db_service, args.contacts)
+        page = {"limit": args.page_size}
+        variants = [
+            ("before: jsonable_encoder + json", "/bench/legacy-contacts", page, False),
+            ("orjson", "/api/contacts", page, False),
+            ("orjson + gzip", "/api/contacts", page, True),
+            (f"orjson fields={PROJECTION}", "/api/contacts", {**page, "fields": PROJECTION}, False),
+            ("orjson fields + gzip", "/api/contacts", {**page, "fields": PROJECTION}, True),
+        ]
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            results = [
+                (name, await measure(client, path, params, gzip, args.pages))
+                for name, path, params, gzip in variants
+            ]
+    finally:
+        await main.app.router.shutdown()
+    
+    print(f"{args.contacts} contacts, {args.page_size} per page, {args.pages} pages per variant")
+    print(f"{'variant':<52} {'bytes/page':>12} {'cpu ms/page':>12} {'wall ms/page':>13}")
+    for name, result in results:
+        print(f"{name:<52} {result['bytes']:>12,} {result['cpu_ms']:>12.2f} {result['wall_ms']:>13.2f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--contacts", type=int, default=2000)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--pages", type=int, default=200)
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
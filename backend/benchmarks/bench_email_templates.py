@@ -0,0 +1,105 @@
+"""Benchmark email rendering: precompiled Jinja2 templates vs the old f-string.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_email_templates [--iterations 20000]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from email_service import EmailTemplates
+from models import ContactRequest
+
+def legacy_template(contact_data: ContactRequest) -> str:
+    """The f-string template EmailService used before Jinja2 (no escaping)"""
+    phone_info = ""
+    if contact_data.phoneNumber:
+        phone_info = f"""
+        <tr>
+            <td style="padding: 8px 0; font-weight: bold; color: #374151;">Phone:</td>
+            <td style="padding: 8px 0; color: #4b5563;">{contact_data.countryCode} {contact_data.phoneNumber}</td>
+        </tr>
+        """
+    
+    return f"""
+    <!DOCTYPE html>
+    <html>
+    <head>
+        <meta charset="utf-8">
+        <title>New Contact Form Submission</title>
+    </head>
+    <body style="font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif; line-height: 1.6; color: #333; max-width: 600px; margin: 0 auto; padding: 20px;">
+        <div style="background: linear-gradient(135deg, #0ea5e9 0%, #0284c7 100%); padding: 30px; text-align: center; border-radius: 10px 10px 0 0;">
+            <h1 style="color: white; margin: 0; font-size: 28px;">New Contact Form Submission</h1>
+            <p style="color: #e0f2fe; margin: 10px 0 0 0; font-size: 16px;">From EmptyMug Website</p>
+        </div>
+        
+        <div style="background: #fff; padding: 30px; border: 1px solid #e5e7eb; border-top: none; border-radius: 0 0 10px 10px;">
+            <h2 style="color: #1f2937; margin-top: 0; font-size: 22px;">Contact Details</h2>
+            
+            <table style="width: 100%; border-collapse: collapse; margin-bottom: 20px;">
+                <tr>
+                    <td style="padding: 8px 0; font-weight: bold; color: #374151; width: 100px;">Name:</td>
+                    <td style="padding: 8px 0; color: #4b5563;">{contact_data.fullName}</td>
+                </tr>
+                <tr>
+                    <td style="padding: 8px 0; font-weight: bold; color: #374151;">Email:</td>
+                    <td style="padding: 8px 0; color: #4b5563;"><a href="mailto:{contact_data.email}" style="color: #0ea5e9; text-decoration: none;">{contact_data.email}</a></td>
+                </tr>
+                {phone_info}
+            </table>
+            
+            <h3 style="color: #1f2937; margin-top: 25px; margin-bottom: 10px; font-size: 18px;">Message</h3>
+            <div style="background: #f9fafb; padding: 20px; border-radius: 8px; border-left: 4px solid #0ea5e9;">
+                <p style="margin: 0; color: #4b5563; white-space: pre-line;">{contact_data.message}</p>
+            </div>
+            
+            <div style="margin-top: 30px; padding-top: 20px; border-top: 1px solid #e5e7eb; color: #6b7280; font-size: 14px;">
+                <p style="margin: 0;">This email was sent from the contact form on <strong>emptymug.fr</strong></p>
+                <p style="margin: 5px 0 0 0;">Please reply directly to this email to respond to the inquiry.</p>
+            </div>
+        </div>
+    </body>
+    </html>
+    """
+
+def renders_per_second(render, contact, iterations: int) -> float:
+    for _ in range(min(iterations, 1000)):
+        render(contact)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        render(contact)
+    return iterations / (time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+    
+    contact = ContactRequest(
+        fullName="Jane Doe",
+        email="jane.doe@example.org",
+        phoneNumber="+33 6 12 34 56 78",
+        countryCode="FR",
+        message="I would like to know more about your services. " * 40
+    )
+    
+    start = time.perf_counter()
+    templates = EmailTemplates()
+    setup_ms = (time.perf_counter() - start) * 1000
+    
+    results = {
+        "f-string (html only, unescaped)": renders_per_second(legacy_template, contact, args.iterations),
+        "jinja2 (html + text, escaped)": renders_per_second(templates.render_contact, contact, args.iterations),
+    }
+    
+    print(f"EmailTemplates setup: {setup_ms:.1f} ms")
+    for name, rate in results.items():
+        print(f"{name:<34} {rate:>12,.0f} renders/s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""Benchmark import time and cold start time of the backend.
+
+Measures, in fresh interpreters, how long `import main` takes and how long
+a uvicorn process takes to answer /health (accepting connections) and
+/ready (all critical subsystems initialized), per database backend.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_startup --runs 5
+    python -m benchmarks.bench_startup --backend memory,postgres --importtime-top 15
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Dict, List
+
+import httpx
+
+from benchmarks.bench_contact import BACKEND_DIR, RESULTS_DIR, free_port, git_commit
+from benchmarks.stub_ollama import StubOllama, StubOllamaServer
+
+IMPORT_SNIPPET = "import time; start = time.perf_counter(); import main; print(time.perf_counter() - start)"
+
+def app_environment(backend: str, ollama_url: str) -> Dict[str, str]:
+    return {
+        **os.environ,
+        "DATABASE_TYPE": backend,
+        "OLLAMA_HOST": ollama_url,
+        "EMAIL_NOTIFICATIONS_ENABLED": "false",
+        "LOG_LEVEL": "WARNING",
+    }
+
+def measure_import(env: Dict[str, str]) -> float:
+    output = subprocess.check_output(
+        [sys.executable, "-c", IMPORT_SNIPPET], cwd=BACKEND_DIR, env=env, stderr=subprocess.DEVNULL, text=True
+    )
+    return float(output.strip().splitlines()[-1]) * 1000
+
+def heaviest_imports(env: Dict[str, str], top: int) -> List[dict]:
+    """Top-level modules imported by main, by cumulative import time (-X importtime)"""
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True
+    )
+    modules, children = [], []
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or line.count("|") != 2:
+            continue
+        _, cumulative, name = line.split("|")
+        depth = len(name) - len(name.lstrip())
+        if not cumulative.strip().isdigit():
+            continue
+        # importtime prints children before their parent: depth 3 lines are
+        # collected until the depth 1 line of the module that imported them
+        if depth == 3:
+            children.append({"module": name.strip(), "cumulative_ms": round(int(cumulative) / 1000, 1)})
+        elif depth == 1:
+            if name.strip() == "main":
+                modules = children
+            children = []
+    return sorted(modules, key=lambda module: module["cumulative_ms"], reverse=True)[:top]
+
+def measure_startup(env: Dict[str, str]) -> dict:
+    port = free_port()
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env
+    )
+    result = {"health_ms": None, "ready_ms": None, "subsystems": {}}
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=5) as client:
+            deadline = time.monotonic() + 120
+            while time.monotonic() < deadline and process.poll() is None:
+                try:
+                    if result["health_ms"] is None and client.get("/health").status_code == 200:
+                        result["health_ms"] = round((time.perf_counter() - start) * 1000, 1)
+                    if result["health_ms"] is not None:
+                        response = client.get("/ready")
+                        result["subsystems"] = response.json()["subsystems"]
+                        states = [state["status"] for state in result["subsystems"].values()]
+                        if response.status_code == 200 or "pending" not in states:
+                            if response.status_code == 200:
+                                result["ready_ms"] = round((time.perf_counter() - start) * 1000, 1)
+                            break
+                except httpx.TransportError:
+                    pass
+                time.sleep(0.01)
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+    return result
+
+def median_or_none(values: List[float]):
+    values = [value for value in values if value is not None]
+    return round(statistics.median(values), 1) if values else None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backend", default="memory", help="Comma-separated backends")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--importtime-top", type=int, default=10)
+    parser.add_argument("--output", default=RESULTS_DIR)
+    args = parser.parse_args()
+    
+    runs = []
+    with StubOllamaServer(StubOllama(latency=0.05, jitter=0.0), free_port()) as ollama:
+        for backend in args.backend.split(","):
+            env = app_environment(backend, ollama.url)
+            imports = [measure_import(env) for _ in range(args.runs)]
+            startups = [measure_startup(env) for _ in range(args.runs)]
+            run = {
+                "backend": backend,
+                "import_ms": median_or_none(imports),
+                "health_ms": median_or_none([startup["health_ms"] for startup in startups]),
+                "ready_ms": median_or_none([startup["ready_ms"] for startup in startups]),
+                "subsystems": startups[-1]["subsystems"],
+                "heaviest_imports": heaviest_imports(env, args.importtime_top),
+            }
+            runs.append(run)
+            print(
+                f"{backend:<9} import={run['import_ms']}ms health={run['health_ms']}ms ready={run['ready_ms']}ms",
+                file=sys.stderr
+            )
+            for module in run["heaviest_imports"]:
+                print(f"    {module['cumulative_ms']:>8.1f} ms  {module['module']}", file=sys.stderr)
+    
+    result = {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "runs_per_backend": args.runs,
+        "runs": runs,
+    }
+    os.makedirs(args.output, exist_ok=True)
+    path = os.path.join(args.output, f"startup_{datetime.now(timezone.utc):%Y%m%dT%H%M%S}_{result['commit']}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    print(f"Results written to {path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""Stand-in for an Ollama server with configurable latency, errors, verbosity and model loading.
+
+Serves the endpoints the backend uses (/api/generate, /api/tags) without a
+model, so the moderation path can be benchmarked on any machine:
+
+    python -m benchmarks.stub_ollama --port 11435 --latency 0.8 --error-rate 0.05
+    python -m benchmarks.stub_ollama --cold-load 5 --unload-after 60
+"""
+import argparse
+import asyncio
+import json
+import random
+import threading
+import time
+
+import uvicorn
+
+class StubOllama:
+    """Raw ASGI app answering /api/generate with a streamed moderation verdict"""
+    
+    def __init__(self, latency: float = 0.5, jitter: float = 0.1, error_rate: float = 0.0,
+                 verbosity: int = 1, model: str = "llama2", cold_load: float = 0.0,
+                 unload_after: float = 300.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        # Number of streamed chunks; higher values mimic chatty models
+        self.verbosity = max(1, verbosity)
+        self.model = model
+        # Time to "load" the model on the first call and after unload_after idle seconds
+        self.cold_load = cold_load
+        self.unload_after = unload_after
+        self.loaded_at = None
+        self.requests = 0
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return
+        
+        body = b""
+        more_body = True
+        while more_body:
+            message = await receive()
+            body += message.get("body", b"")
+            more_body = message.get("more_body", False)
+        
+        if scope["path"] == "/api/tags":
+            await self._respond(send, 200, [{"models": [{"name": f"{self.model}:latest"}]}])
+            return
+        if scope["path"] != "/api/generate":
+            await self._respond(send, 404, [{"error": "not found"}])
+            return
+        
+        self.requests += 1
+        load_duration = await self._load_model()
+        prompt = json.loads(body or b"{}").get("prompt")
+        if not prompt:
+            # Ollama only loads the model when the prompt is empty
+            await self._respond(send, 200, [
+                {"model": self.model, "response": "", "done": True, "load_duration": load_duration}
+            ])
+            return
+        
+        await asyncio.sleep(max(0.0, random.gauss(self.latency, self.jitter)))
+        if random.random() < self.error_rate:
+            await self._respond(send, 500, [{"error": "stub failure"}])
+            return
+        
+        verdict = json.dumps({"is_clean": True, "message": "Content is appropriate", "score": 0.95})
+        if self.verbosity > 1:
+            verdict = "Here is my analysis of the text. " * (self.verbosity - 1) + verdict
+        step = max(1, len(verdict) // self.verbosity)
+        chunks = [
+            {"model": self.model, "response": verdict[i:i + step], "done": False}
+            for i in range(0, len(verdict), step)
+        ]
+        chunks.append({"model": self.model, "response": "", "done": True, "load_duration": load_duration})
+        await self._respond(send, 200, chunks)
+    
+    async def _load_model(self) -> int:
+        """Simulate loading the model if it is not resident; returns the load time in nanoseconds"""
+        now = time.monotonic()
+        start = now
+        if self.loaded_at is None or now - self.loaded_at > self.unload_after:
+            await asyncio.sleep(self.cold_load)
+        self.loaded_at = time.monotonic()
+        return int((self.loaded_at - start) * 1e9)
+    
+    @staticmethod
+    async def _respond(send, status: int, lines):
+        body = "".join(json.dumps(line) + "\n" for line in lines).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(b"content-type", b"application/x-ndjson")],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+class StubOllamaServer:
+    """Runs a StubOllama app on a background thread"""
+    
+    def __init__(self, app: StubOllama, port: int):
+        self.app = app
+        self.port = port
+        self.server = uvicorn.Server(uvicorn.Config(
+            app, host="127.0.0.1", port=port, log_level="warning", lifespan="off"
+        ))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+    
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+    
+    def __enter__(self):
+        self.thread.start()
+        deadline = time.monotonic() + 10
+        while not self.server.started:
+            if time.monotonic() > deadline:
+                raise RuntimeError("Stub Ollama server did not start")
+            time.sleep(0.01)
+        return self
+    
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join(timeout=5)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--latency", type=float, default=0.5, help="Mean response time in seconds")
+    parser.add_argument("--jitter", type=float, default=0.1, help="Standard deviation of the latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 500")
+    parser.add_argument("--verbosity", type=int, default=1, help="Number of streamed response chunks")
+    parser.add_argument("--cold-load", type=float, default=0.0, help="Seconds to load the model when not resident")
+    parser.add_argument("--unload-after", type=float, default=300.0, help="Idle seconds before the model unloads")
+    args = parser.parse_args()
+    
+    app = StubOllama(
+        args.latency, args.jitter, args.error_rate, args.verbosity,
+        cold_load=args.cold_load, unload_after=args.unload_after
+    )
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning", lifespan="off")
+
+if __name__ == "__main__":
+    main()
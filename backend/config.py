@@ -22,14 +22,147 @@ class Settings(BaseSettings):
     dynamodb_table_name: str = Field(default="emptymug_contacts", description="DynamoDB table name")
     aws_access_key_id: str = Field(default="", description="AWS Access Key ID")
     aws_secret_access_key: str = Field(default="", description="AWS Secret Access Key")
+    dynamodb_endpoint_url: str = Field(
+        default="", description="Custom DynamoDB endpoint, e.g. DynamoDB Local (AWS when empty)"
+    )
+    dynamodb_idempotency_table_name: str = Field(
+        default="emptymug_idempotency_keys",
+        description="DynamoDB table name for idempotency keys"
+    )
     
     # LLM settings
     ollama_host: str = Field(default="http://localhost:11434", description="Ollama host URL")
     ollama_model: str = Field(default="llama2", description="Ollama model name")
+    ollama_keep_alive: str = Field(
+        default="30m", description="How long Ollama keeps the model loaded after a call"
+    )
+    ollama_warmup_enabled: bool = Field(default=True, description="Load the model at startup")
+    ollama_warmup_timeout_seconds: float = Field(
+        default=120.0, description="Upper bound for a warm-up or heartbeat call"
+    )
+    ollama_heartbeat_interval_seconds: float = Field(
+        default=240.0, description="Ping the model after this much idle time to keep it loaded (0 disables)"
+    )
+    ollama_cold_load_threshold_seconds: float = Field(
+        default=1.0, description="Model load time above which a call counts as a cold load"
+    )
+    ollama_system_prompt_enabled: bool = Field(
+        default=False, description="Send the moderation instructions as a short, cached system prompt"
+    )
+    
+    # Idempotency settings
+    idempotency_ttl_seconds: int = Field(
+        default=86400, description="How long an Idempotency-Key result is kept"
+    )
+    idempotency_content_window_seconds: int = Field(
+        default=300, description="Window for deduplicating identical email+message submissions"
+    )
+    idempotency_max_entries: int = Field(
+        default=10000, description="Maximum idempotency records held by the in-memory store"
+    )
+    idempotency_wait_timeout_seconds: float = Field(
+        default=30.0, description="How long a duplicate waits for the in-flight request"
+    )
+    
+    # Rate limiting settings
+    rate_limit_enabled: bool = Field(default=True, description="Throttle contact submissions")
+    rate_limit_ip_requests: int = Field(default=5, description="Submissions allowed per client IP per window")
+    rate_limit_ip_window_seconds: int = Field(default=60, description="Per-IP refill window")
+    rate_limit_email_requests: int = Field(default=3, description="Submissions allowed per email per window")
+    rate_limit_email_window_seconds: int = Field(default=3600, description="Per-email refill window")
+    rate_limit_trust_proxy_headers: bool = Field(
+        default=False, description="Use X-Forwarded-For as the client IP (only behind a trusted proxy)"
+    )
+    rate_limit_trusted_proxy_hops: int = Field(
+        default=1, ge=1, description="Trusted proxies appending to X-Forwarded-For in front of the app"
+    )
+    rate_limit_backend: Literal["memory", "sqlite"] = Field(
+        default="memory", description="Where rate limit buckets are kept (sqlite uses shared_state_path)"
+    )
+    rate_limit_max_keys: int = Field(default=100000, description="Maximum buckets held in memory")
+    
+    # Shared state settings (moderation verdicts and metrics across worker processes)
+    shared_state_backend: Literal["memory", "sqlite"] = Field(
+        default="memory", description="Where state shared by workers is kept (sqlite for several workers)"
+    )
+    shared_state_path: str = Field(
+        default="shared_state.sqlite3", description="SQLite file shared by workers when backend is sqlite"
+    )
+    shared_state_max_entries: int = Field(default=10000, description="Maximum cached entries")
+    shared_state_publish_interval_seconds: float = Field(
+        default=5.0, description="How often each worker publishes its metrics for the others"
+    )
+    moderation_cache_ttl_seconds: int = Field(
+        default=86400, description="How long a moderation verdict is reused for an identical message (0 disables)"
+    )
+    
+    # Email notification queue settings
+    email_notifications_enabled: bool = Field(
+        default=True, description="Send a notification email for each stored contact"
+    )
+    email_spool_dir: str = Field(
+        default="mail_spool", description="Directory where queued emails survive restarts"
+    )
+    email_pool_size: int = Field(default=2, description="Persistent SMTP connections to keep open")
+    email_max_retries: int = Field(default=5, description="Delivery attempts before an email is parked")
+    email_retry_base_delay_seconds: float = Field(
+        default=5.0, description="First retry delay, doubled on each further attempt"
+    )
+    email_connection_idle_seconds: float = Field(
+        default=60.0, description="Close pooled SMTP connections idle for longer than this"
+    )
+    email_digest_threshold: int = Field(
+        default=10, description="Submissions per minute above which emails are batched into a digest"
+    )
+    email_digest_interval_seconds: float = Field(
+        default=60.0, description="How long to collect submissions for one digest"
+    )
+    email_template_cache_dir: str = Field(
+        default="", description="Jinja2 bytecode cache directory (system temp dir when empty)"
+    )
     
     # Application settings
+    workers: int = Field(default=1, description="Worker processes started by `python main.py`")
+    gzip_minimum_size: int = Field(
+        default=1024, description="Gzip responses of at least this many bytes when the client accepts it (0 disables)"
+    )
+    gzip_compress_level: int = Field(
+        default=1, ge=1, le=9, description="Gzip level; 1 gets most of the size reduction for far less CPU than 9"
+    )
+    email_check_deliverability: bool = Field(
+        default=True, description="Look up the MX/A records of submitted email domains (DNS on every submission)"
+    )
     cors_origins: str = Field(default="http://localhost:3000", description="CORS origins")
     log_level: str = Field(default="INFO", description="Logging level")
+    log_format: Literal["json", "text"] = Field(default="json", description="Log output format")
+    profiling_sample_rate: float = Field(
+        default=0.0, ge=0.0, le=1.0, description="Fraction of requests to profile (0 disables sampling)"
+    )
+    profiling_debug_token: str = Field(
+        default="", description="Requests with this X-Debug-Profile header value are profiled (empty disables)"
+    )
+    profiling_path_prefixes: str = Field(
+        default="/api/contact", description="Comma-separated path prefixes eligible for profiling"
+    )
+    profiling_interval_ms: float = Field(default=5.0, description="Stack sampling interval of profiled requests")
+    profiling_dir: str = Field(default="profiles", description="Directory where request profiles are written")
+    profiling_max_profiles: int = Field(default=50, description="Profiles kept before the oldest are removed")
+    health_probe_interval_seconds: float = Field(
+        default=15.0, description="How often the database and Ollama are probed for /health"
+    )
+    health_probe_timeout_seconds: float = Field(default=3.0, description="Timeout of each health probe")
+    readiness_wait_timeout_seconds: float = Field(
+        default=10.0, description="How long a request waits for startup initialization before a 503"
+    )
+    startup_retry_initial_seconds: float = Field(
+        default=1.0, description="First backoff before retrying a failed critical subsystem initialization"
+    )
+    startup_retry_max_seconds: float = Field(
+        default=30.0, description="Upper bound of the startup retry backoff"
+    )
+    server_timing_enabled: bool = Field(
+        default=False, description="Add a Server-Timing header with per-stage latency to responses"
+    )
     
     class Config:
         env_file = ".env"
@@ -2,6 +2,7 @@ from sqlalchemy import Column, String, Text, DateTime, Integer, create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from datetime import datetime
+import json
 import uuid
 
 Base = declarative_base()
@@ -27,3 +28,23 @@ class Contact(Base):
             "message": self.message,
             "created_at": self.created_at.isoformat() if self.created_at else None
         }
+
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+    
+    key = Column(String(255), primary_key=True)
+    status = Column(String(20), nullable=False, default="pending")
+    response = Column(Text, nullable=True)
+    # SHA-256 of the payload sent with a client-supplied key
+    request_hash = Column(String(64), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False, index=True)
+    
+    def to_dict(self):
+        return {
+            "key": self.key,
+            "status": self.status,
+            "response": json.loads(self.response) if self.response else None,
+            "request_hash": self.request_hash,
+            "expires_at": self.expires_at.isoformat() if self.expires_at else None
+        }
@@ -1,39 +1,86 @@
 from abc import ABC, abstractmethod
-from typing import List, Optional
-from datetime import datetime
+from typing import List, Optional, Sequence
+from collections import OrderedDict
+from itertools import islice
+from datetime import datetime, timedelta
 import json
+import time
 import uuid
 from config import settings
-from database.models import Contact
 
 class DatabaseService(ABC):
     """Abstract base class for database services"""
     
+    # Columns of a contact record, in response order
+    CONTACT_FIELDS = ("id", "full_name", "email", "phone_number", "country_code", "message", "created_at")
+    
     @abstractmethod
     async def create_contact(self, contact_data: dict) -> str:
         """Create a new contact record"""
         pass
     
     @abstractmethod
-    async def get_contact(self, contact_id: str) -> Optional[dict]:
-        """Get a contact by ID"""
+    async def get_contact(self, contact_id: str, fields: Optional[Sequence[str]] = None) -> Optional[dict]:
+        """Get a contact by ID, reading only the given fields (all when None)"""
         pass
     
     @abstractmethod
-    async def list_contacts(self, limit: int = 100, offset: int = 0) -> List[dict]:
-        """List contacts with pagination"""
+    async def list_contacts(
+        self, limit: int = 100, offset: int = 0, fields: Optional[Sequence[str]] = None
+    ) -> List[dict]:
+        """List contacts with pagination, reading only the given fields (all when None)"""
         pass
     
     @abstractmethod
     async def initialize(self):
         """Initialize the database connection and schema"""
         pass
+    
+    @abstractmethod
+    async def ping(self):
+        """Cheapest possible round trip to the database; raises if it is unreachable"""
+        pass
+    
+    @abstractmethod
+    async def claim_idempotency_key(
+        self, key: str, ttl_seconds: int, request_hash: Optional[str] = None
+    ) -> Optional[dict]:
+        """Atomically claim an idempotency key.
+        
+        Returns None when the caller now owns the key, otherwise the existing
+        record ({"status": "pending" | "completed", "response": ..., "request_hash": ...}).
+        """
+        pass
+    
+    @abstractmethod
+    async def get_idempotency_key(self, key: str) -> Optional[dict]:
+        """Get an unexpired idempotency record"""
+        pass
+    
+    @abstractmethod
+    async def complete_idempotency_key(
+        self, key: str, response: dict, ttl_seconds: int, request_hash: Optional[str] = None
+    ):
+        """Store the final response for a claimed idempotency key"""
+        pass
+    
+    @abstractmethod
+    async def extend_idempotency_key(self, key: str, ttl_seconds: int):
+        """Push back the expiry of a pending claim while its request is still running"""
+        pass
+    
+    @abstractmethod
+    async def release_idempotency_key(self, key: str):
+        """Drop a claimed key so that a retry can run the request again"""
+        pass
 
 class InMemoryDatabaseService(DatabaseService):
     """In-memory database service for development"""
     
     def __init__(self):
         self.contacts = {}
+        # key -> record, oldest first; bounded by settings.idempotency_max_entries
+        self.idempotency_keys = OrderedDict()
     
     async def create_contact(self, contact_data: dict) -> str:
         contact_id = str(uuid.uuid4())
@@ -48,16 +95,72 @@ class InMemoryDatabaseService(DatabaseService):
         }
         return contact_id
     
-    async def get_contact(self, contact_id: str) -> Optional[dict]:
-        return self.contacts.get(contact_id)
+    async def get_contact(self, contact_id: str, fields: Optional[Sequence[str]] = None) -> Optional[dict]:
+        contact = self.contacts.get(contact_id)
+        if contact is None or fields is None:
+            return contact
+        return {field: contact[field] for field in fields}
     
-    async def list_contacts(self, limit: int = 100, offset: int = 0) -> List[dict]:
-        contacts_list = list(self.contacts.values())
-        return contacts_list[offset:offset + limit]
+    async def list_contacts(
+        self, limit: int = 100, offset: int = 0, fields: Optional[Sequence[str]] = None
+    ) -> List[dict]:
+        contacts_list = list(islice(self.contacts.values(), offset, offset + limit))
+        if fields is None:
+            return contacts_list
+        return [{field: contact[field] for field in fields} for contact in contacts_list]
     
     async def initialize(self):
         # No initialization needed for in-memory storage
         pass
+    
+    async def ping(self):
+        pass
+    
+    def _live_idempotency_record(self, key: str) -> Optional[dict]:
+        record = self.idempotency_keys.get(key)
+        if record and record["expires_at"] <= time.monotonic():
+            del self.idempotency_keys[key]
+            return None
+        return record
+    
+    async def claim_idempotency_key(
+        self, key: str, ttl_seconds: int, request_hash: Optional[str] = None
+    ) -> Optional[dict]:
+        existing = self._live_idempotency_record(key)
+        if existing:
+            return existing
+        
+        self.idempotency_keys[key] = {
+            "status": "pending",
+            "response": None,
+            "request_hash": request_hash,
+            "expires_at": time.monotonic() + ttl_seconds
+        }
+        while len(self.idempotency_keys) > settings.idempotency_max_entries:
+            self.idempotency_keys.popitem(last=False)
+        return None
+    
+    async def get_idempotency_key(self, key: str) -> Optional[dict]:
+        return self._live_idempotency_record(key)
+    
+    async def complete_idempotency_key(
+        self, key: str, response: dict, ttl_seconds: int, request_hash: Optional[str] = None
+    ):
+        self.idempotency_keys[key] = {
+            "status": "completed",
+            "response": response,
+            "request_hash": request_hash,
+            "expires_at": time.monotonic() + ttl_seconds
+        }
+        self.idempotency_keys.move_to_end(key)
+    
+    async def extend_idempotency_key(self, key: str, ttl_seconds: int):
+        record = self.idempotency_keys.get(key)
+        if record and record["status"] == "pending":
+            record["expires_at"] = time.monotonic() + ttl_seconds
+    
+    async def release_idempotency_key(self, key: str):
+        self.idempotency_keys.pop(key, None)
 
 class PostgreSQLDatabaseService(DatabaseService):
     """PostgreSQL database service"""
@@ -65,10 +168,12 @@ class PostgreSQLDatabaseService(DatabaseService):
     def __init__(self):
         self.engine = None
         self.SessionLocal = None
+        self._last_idempotency_purge = 0.0
     
     async def initialize(self):
         from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
         from sqlalchemy.orm import sessionmaker
+        from sqlalchemy import text
         from database.models import Base
         import asyncpg
         
@@ -91,8 +196,20 @@ class PostgreSQLDatabaseService(DatabaseService):
         # Create tables
         async with self.engine.begin() as conn:
             await conn.run_sync(Base.metadata.create_all)
+            # create_all does not add columns to an existing idempotency_keys table
+            await conn.execute(text(
+                "ALTER TABLE idempotency_keys ADD COLUMN IF NOT EXISTS request_hash VARCHAR(64)"
+            ))
+    
+    async def ping(self):
+        from sqlalchemy import text
+        
+        async with self.engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
     
     async def create_contact(self, contact_data: dict) -> str:
+        from database.models import Contact
+        
         async with self.SessionLocal() as session:
             contact = Contact(
                 full_name=contact_data["full_name"],
@@ -106,25 +223,158 @@ class PostgreSQLDatabaseService(DatabaseService):
             await session.refresh(contact)
             return contact.id
     
-    async def get_contact(self, contact_id: str) -> Optional[dict]:
+    async def get_contact(self, contact_id: str, fields: Optional[Sequence[str]] = None) -> Optional[dict]:
+        from database.models import Contact
         from sqlalchemy import select
         
         async with self.SessionLocal() as session:
+            if fields is not None:
+                result = await session.execute(
+                    self._select_fields(fields).where(Contact.id == contact_id)
+                )
+                row = result.one_or_none()
+                return self._row_to_dict(row, fields) if row else None
+            
             result = await session.execute(
                 select(Contact).where(Contact.id == contact_id)
             )
             contact = result.scalar_one_or_none()
             return contact.to_dict() if contact else None
     
-    async def list_contacts(self, limit: int = 100, offset: int = 0) -> List[dict]:
+    async def list_contacts(
+        self, limit: int = 100, offset: int = 0, fields: Optional[Sequence[str]] = None
+    ) -> List[dict]:
+        from database.models import Contact
         from sqlalchemy import select
         
         async with self.SessionLocal() as session:
+            if fields is not None:
+                # Only the requested columns are read, so unrequested message bodies never leave the database
+                result = await session.execute(
+                    self._select_fields(fields).offset(offset).limit(limit)
+                )
+                return [self._row_to_dict(row, fields) for row in result.all()]
+            
             result = await session.execute(
                 select(Contact).offset(offset).limit(limit)
             )
             contacts = result.scalars().all()
             return [contact.to_dict() for contact in contacts]
+    
+    @staticmethod
+    def _select_fields(fields: Sequence[str]):
+        from database.models import Contact
+        from sqlalchemy import select
+        
+        return select(*(getattr(Contact, field) for field in fields))
+    
+    @staticmethod
+    def _row_to_dict(row, fields: Sequence[str]) -> dict:
+        contact = dict(zip(fields, row))
+        if contact.get("created_at") is not None:
+            contact["created_at"] = contact["created_at"].isoformat()
+        return contact
+    
+    async def claim_idempotency_key(
+        self, key: str, ttl_seconds: int, request_hash: Optional[str] = None
+    ) -> Optional[dict]:
+        from database.models import IdempotencyKey
+        from sqlalchemy import delete, select
+        from sqlalchemy.dialects.postgresql import insert
+        
+        now = datetime.utcnow()
+        # The primary key is the unique index; an expired row may be taken over
+        stmt = insert(IdempotencyKey).values(
+            key=key,
+            status="pending",
+            response=None,
+            request_hash=request_hash,
+            created_at=now,
+            expires_at=now + timedelta(seconds=ttl_seconds)
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[IdempotencyKey.key],
+            set_={
+                "status": "pending",
+                "response": None,
+                "request_hash": stmt.excluded.request_hash,
+                "created_at": now,
+                "expires_at": stmt.excluded.expires_at
+            },
+            where=IdempotencyKey.expires_at <= now
+        )
+        
+        async with self.SessionLocal() as session:
+            result = await session.execute(stmt)
+            # Expired rows are purged at most once a minute to keep the table bounded
+            if time.monotonic() - self._last_idempotency_purge > 60:
+                self._last_idempotency_purge = time.monotonic()
+                await session.execute(
+                    delete(IdempotencyKey).where(IdempotencyKey.expires_at <= now)
+                )
+            await session.commit()
+            if result.rowcount == 1:
+                return None
+            
+            existing = await session.execute(
+                select(IdempotencyKey).where(IdempotencyKey.key == key)
+            )
+            record = existing.scalar_one_or_none()
+            return record.to_dict() if record else None
+    
+    async def get_idempotency_key(self, key: str) -> Optional[dict]:
+        from database.models import IdempotencyKey
+        from sqlalchemy import select
+        
+        async with self.SessionLocal() as session:
+            result = await session.execute(
+                select(IdempotencyKey).where(
+                    IdempotencyKey.key == key,
+                    IdempotencyKey.expires_at > datetime.utcnow()
+                )
+            )
+            record = result.scalar_one_or_none()
+            return record.to_dict() if record else None
+    
+    async def complete_idempotency_key(
+        self, key: str, response: dict, ttl_seconds: int, request_hash: Optional[str] = None
+    ):
+        from database.models import IdempotencyKey
+        from sqlalchemy import update
+        
+        async with self.SessionLocal() as session:
+            await session.execute(
+                update(IdempotencyKey)
+                .where(IdempotencyKey.key == key)
+                .values(
+                    status="completed",
+                    response=json.dumps(response),
+                    expires_at=datetime.utcnow() + timedelta(seconds=ttl_seconds)
+                )
+            )
+            await session.commit()
+    
+    async def extend_idempotency_key(self, key: str, ttl_seconds: int):
+        from database.models import IdempotencyKey
+        from sqlalchemy import update
+        
+        async with self.SessionLocal() as session:
+            await session.execute(
+                update(IdempotencyKey)
+                .where(IdempotencyKey.key == key, IdempotencyKey.status == "pending")
+                .values(expires_at=datetime.utcnow() + timedelta(seconds=ttl_seconds))
+            )
+            await session.commit()
+    
+    async def release_idempotency_key(self, key: str):
+        from database.models import IdempotencyKey
+        from sqlalchemy import delete
+        
+        async with self.SessionLocal() as session:
+            await session.execute(
+                delete(IdempotencyKey).where(IdempotencyKey.key == key)
+            )
+            await session.commit()
 
 class DynamoDBDatabaseService(DatabaseService):
     """DynamoDB database service using sync boto3 with async wrapper"""
@@ -132,6 +382,7 @@ class DynamoDBDatabaseService(DatabaseService):
     def __init__(self):
         self.dynamodb = None
         self.table = None
+        self.idempotency_table = None
     
     async def initialize(self):
         import boto3
@@ -148,7 +399,9 @@ class DynamoDBDatabaseService(DatabaseService):
             aws_secret_access_key=settings.aws_secret_access_key or None,
         )
         
-        self.dynamodb = session.resource('dynamodb')
+        self.dynamodb = session.resource(
+            'dynamodb', endpoint_url=settings.dynamodb_endpoint_url or None
+        )
         
         # Get or create table
         try:
@@ -160,6 +413,23 @@ class DynamoDBDatabaseService(DatabaseService):
         except Exception:
             # Create table if it doesn't exist
             await self._create_table()
+        
+        try:
+            self.idempotency_table = self.dynamodb.Table(settings.dynamodb_idempotency_table_name)
+            await asyncio.get_event_loop().run_in_executor(
+                self.executor, lambda: self.idempotency_table.table_status
+            )
+        except Exception:
+            await self._create_idempotency_table()
+    
+    async def ping(self):
+        import asyncio
+        
+        def get_item_sync():
+            # A key lookup is a single cheap read and needs no table-level permissions
+            self.table.get_item(Key={"id": "__health__"}, ProjectionExpression="id")
+        
+        await asyncio.get_event_loop().run_in_executor(self.executor, get_item_sync)
     
     async def _create_table(self):
         import asyncio
@@ -190,6 +460,42 @@ class DynamoDBDatabaseService(DatabaseService):
             self.executor, create_table_sync
         )
     
+    async def _create_idempotency_table(self):
+        import asyncio
+        
+        def create_table_sync():
+            table = self.dynamodb.create_table(
+                TableName=settings.dynamodb_idempotency_table_name,
+                KeySchema=[
+                    {
+                        'AttributeName': 'key',
+                        'KeyType': 'HASH'
+                    }
+                ],
+                AttributeDefinitions=[
+                    {
+                        'AttributeName': 'key',
+                        'AttributeType': 'S'
+                    }
+                ],
+                BillingMode='PAY_PER_REQUEST'
+            )
+            table.wait_until_exists()
+            
+            # Let DynamoDB delete expired keys so the table stays bounded
+            self.dynamodb.meta.client.update_time_to_live(
+                TableName=settings.dynamodb_idempotency_table_name,
+                TimeToLiveSpecification={
+                    'Enabled': True,
+                    'AttributeName': 'expires_at'
+                }
+            )
+            return table
+        
+        self.idempotency_table = await asyncio.get_event_loop().run_in_executor(
+            self.executor, create_table_sync
+        )
+    
     async def create_contact(self, contact_data: dict) -> str:
         import asyncio
         
@@ -212,29 +518,153 @@ class DynamoDBDatabaseService(DatabaseService):
         )
         return contact_id
     
-    async def get_contact(self, contact_id: str) -> Optional[dict]:
+    @staticmethod
+    def _projection(fields: Optional[Sequence[str]]) -> dict:
+        """ProjectionExpression arguments reading only the given attributes"""
+        if fields is None:
+            return {}
+        # Attribute names go through placeholders since some (e.g. "message") may be reserved words
+        names = {f"#f{i}": field for i, field in enumerate(fields)}
+        return {"ProjectionExpression": ", ".join(names), "ExpressionAttributeNames": names}
+    
+    async def get_contact(self, contact_id: str, fields: Optional[Sequence[str]] = None) -> Optional[dict]:
         import asyncio
         
         def get_item_sync():
-            response = self.table.get_item(Key={"id": contact_id})
+            response = self.table.get_item(Key={"id": contact_id}, **self._projection(fields))
             return response.get("Item")
         
         return await asyncio.get_event_loop().run_in_executor(
             self.executor, get_item_sync
         )
     
-    async def list_contacts(self, limit: int = 100, offset: int = 0) -> List[dict]:
+    async def list_contacts(
+        self, limit: int = 100, offset: int = 0, fields: Optional[Sequence[str]] = None
+    ) -> List[dict]:
         import asyncio
         
         def scan_sync():
             # Note: DynamoDB doesn't support traditional offset-based pagination
             # This is a simplified implementation
-            response = self.table.scan(Limit=limit)
+            response = self.table.scan(Limit=limit, **self._projection(fields))
             return response.get("Items", [])
         
         return await asyncio.get_event_loop().run_in_executor(
             self.executor, scan_sync
         )
+    
+    @staticmethod
+    def _idempotency_record(item: dict) -> dict:
+        return {
+            "key": item["key"],
+            "status": item["status"],
+            "response": json.loads(item["response"]) if item.get("response") else None,
+            "request_hash": item.get("request_hash"),
+            "expires_at": int(item["expires_at"])
+        }
+    
+    async def claim_idempotency_key(
+        self, key: str, ttl_seconds: int, request_hash: Optional[str] = None
+    ) -> Optional[dict]:
+        import asyncio
+        from botocore.exceptions import ClientError
+        
+        now = int(time.time())
+        item = {"key": key, "status": "pending", "expires_at": now + ttl_seconds}
+        if request_hash:
+            item["request_hash"] = request_hash
+        
+        def claim_sync():
+            try:
+                # Conditional put: only succeeds if the key is new or expired
+                self.idempotency_table.put_item(
+                    Item=item,
+                    ConditionExpression="attribute_not_exists(#k) OR expires_at <= :now",
+                    ExpressionAttributeNames={"#k": "key"},
+                    ExpressionAttributeValues={":now": now}
+                )
+                return None
+            except ClientError as e:
+                if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                    raise
+            response = self.idempotency_table.get_item(Key={"key": key}, ConsistentRead=True)
+            item = response.get("Item")
+            return self._idempotency_record(item) if item else None
+        
+        return await asyncio.get_event_loop().run_in_executor(
+            self.executor, claim_sync
+        )
+    
+    async def get_idempotency_key(self, key: str) -> Optional[dict]:
+        import asyncio
+        
+        def get_item_sync():
+            response = self.idempotency_table.get_item(Key={"key": key}, ConsistentRead=True)
+            item = response.get("Item")
+            # TTL deletion is lazy, so expiry is also checked here
+            if not item or int(item["expires_at"]) <= int(time.time()):
+                return None
+            return self._idempotency_record(item)
+        
+        return await asyncio.get_event_loop().run_in_executor(
+            self.executor, get_item_sync
+        )
+    
+    async def complete_idempotency_key(
+        self, key: str, response: dict, ttl_seconds: int, request_hash: Optional[str] = None
+    ):
+        import asyncio
+        
+        item = {
+            "key": key,
+            "status": "completed",
+            "response": json.dumps(response),
+            "expires_at": int(time.time()) + ttl_seconds
+        }
+        if request_hash:
+            item["request_hash"] = request_hash
+        
+        def put_item_sync():
+            return self.idempotency_table.put_item(Item=item)
+        
+        await asyncio.get_event_loop().run_in_executor(
+            self.executor, put_item_sync
+        )
+    
+    async def extend_idempotency_key(self, key: str, ttl_seconds: int):
+        import asyncio
+        from botocore.exceptions import ClientError
+        
+        def update_item_sync():
+            try:
+                self.idempotency_table.update_item(
+                    Key={"key": key},
+                    UpdateExpression="SET expires_at = :expires_at",
+                    ConditionExpression="#s = :pending",
+                    ExpressionAttributeNames={"#s": "status"},
+                    ExpressionAttributeValues={
+                        ":expires_at": int(time.time()) + ttl_seconds,
+                        ":pending": "pending"
+                    }
+                )
+            except ClientError as e:
+                # Already completed or released; nothing to extend
+                if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                    raise
+        
+        await asyncio.get_event_loop().run_in_executor(
+            self.executor, update_item_sync
+        )
+    
+    async def release_idempotency_key(self, key: str):
+        import asyncio
+        
+        def delete_item_sync():
+            return self.idempotency_table.delete_item(Key={"key": key})
+        
+        await asyncio.get_event_loop().run_in_executor(
+            self.executor, delete_item_sync
+        )
 
 # Factory function to create the appropriate database service
 def create_database_service() -> DatabaseService:
@@ -1,102 +1,384 @@
 import aiosmtplib
+import asyncio
+import json
+import time
+import uuid
+from collections import deque
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 import os
-from typing import Optional
+from typing import Dict, List, Optional, Tuple
 import logging
+from config import settings
+from services import metrics
 from models import ContactRequest
 
 logger = logging.getLogger(__name__)
 
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates", "email")
+
+class EmailTemplates:
+    """Precompiled Jinja2 templates for notification emails.
+    
+    The HTML layout is rendered once at startup and split around the body
+    slot, so each email only renders its escaped per-contact fragment.
+    """
+    
+    _BODY_SLOT = "\x00body\x00"
+    
+    def __init__(self, template_dir: str = TEMPLATE_DIR):
+        from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, select_autoescape
+        from markupsafe import Markup
+        
+        self.env = Environment(
+            loader=FileSystemLoader(template_dir),
+            autoescape=select_autoescape(["html"]),
+            bytecode_cache=FileSystemBytecodeCache(settings.email_template_cache_dir or None),
+            trim_blocks=True,
+            lstrip_blocks=True,
+            auto_reload=False,
+        )
+        self.contact_html = self.env.get_template("contact.html")
+        self.contact_text = self.env.get_template("contact.txt")
+        self.digest_html = self.env.get_template("digest.html")
+        self.digest_text = self.env.get_template("digest.txt")
+        
+        layout = self.env.get_template("layout.html")
+        self._layouts = {}
+        for title in ("New Contact Form Submission", "Contact Form Digest"):
+            rendered = layout.render(title=title, body=Markup(self._BODY_SLOT))
+            self._layouts[title] = tuple(rendered.split(self._BODY_SLOT))
+    
+    def _wrap(self, title: str, body: str) -> str:
+        head, tail = self._layouts[title]
+        return head + body + tail
+    
+    def render_contact(self, contact_data: ContactRequest) -> Tuple[str, str]:
+        """Return the (text, html) bodies for a single submission"""
+        html_body = self._wrap("New Contact Form Submission", self.contact_html.render(contact=contact_data))
+        return self.contact_text.render(contact=contact_data), html_body
+    
+    def render_digest(self, contacts: List[ContactRequest]) -> Tuple[str, str]:
+        """Return the (text, html) bodies for a digest of submissions"""
+        html_body = self._wrap("Contact Form Digest", self.digest_html.render(contacts=contacts))
+        return self.digest_text.render(contacts=contacts), html_body
+
+class SMTPConnectionPool:
+    """Small pool of persistent SMTP connections reused across sends"""
+    
+    def __init__(self, hostname: str, port: int, username: str, password: str, size: int):
+        self.hostname = hostname
+        self.port = port
+        self.username = username
+        self.password = password
+        self._idle: List[Tuple[aiosmtplib.SMTP, float]] = []
+        self._semaphore = asyncio.Semaphore(size)
+    
+    async def _connect(self) -> aiosmtplib.SMTP:
+        # connect() performs STARTTLS and AUTH once per connection
+        client = aiosmtplib.SMTP(
+            hostname=self.hostname,
+            port=self.port,
+            start_tls=True,
+            username=self.username or None,
+            password=self.password or None,
+        )
+        await client.connect()
+        return client
+    
+    def _checkout(self) -> Optional[aiosmtplib.SMTP]:
+        while self._idle:
+            client, last_used = self._idle.pop()
+            if client.is_connected and time.monotonic() - last_used < settings.email_connection_idle_seconds:
+                return client
+            client.close()
+        return None
+    
+    def _checkin(self, client: aiosmtplib.SMTP):
+        self._idle.append((client, time.monotonic()))
+    
+    async def send(self, message: MIMEMultipart):
+        async with self._semaphore:
+            start = time.perf_counter()
+            try:
+                await self._send(message)
+            except Exception:
+                metrics.smtp_duration.observe(time.perf_counter() - start, "error")
+                raise
+            metrics.smtp_duration.observe(time.perf_counter() - start, "success")
+    
+    async def _send(self, message: MIMEMultipart):
+        client = self._checkout()
+        if client is not None:
+            try:
+                await client.send_message(message)
+                self._checkin(client)
+                return
+            except aiosmtplib.SMTPServerDisconnected:
+                # The server dropped the idle connection; retry on a fresh one
+                client.close()
+            except Exception:
+                client.close()
+                raise
+        
+        client = await self._connect()
+        try:
+            await client.send_message(message)
+        except Exception:
+            client.close()
+            raise
+        self._checkin(client)
+    
+    async def close(self):
+        while self._idle:
+            client, _ = self._idle.pop()
+            try:
+                await client.quit()
+            except Exception:
+                client.close()
+
+class MailQueue:
+    """Durable outbound mail queue backed by a local spool directory.
+    
+    Each queued email is written to its own spool file before delivery and
+    removed once sent, so pending emails are picked up again after a restart.
+    Spool files are named after the owning process; with several workers
+    sharing the directory, a worker only takes over files whose owner has
+    exited, so no email is sent by two workers.
+    """
+    
+    def __init__(self, email_service: "EmailService", spool_dir: str):
+        self.email_service = email_service
+        self.spool_dir = spool_dir
+        self.failed_dir = os.path.join(spool_dir, "failed")
+        self.owner = os.getpid()
+        self.pool: Optional[SMTPConnectionPool] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._messages: Dict[str, dict] = {}
+        self._recent = deque()
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._deliveries = set()
+    
+    @property
+    def running(self) -> bool:
+        return self._dispatcher is not None
+    
+    @property
+    def depth(self) -> int:
+        return len(self._messages)
+    
+    async def start(self):
+        self.pool = SMTPConnectionPool(
+            self.email_service.smtp_host,
+            self.email_service.smtp_port,
+            self.email_service.email_user,
+            self.email_service.email_password,
+            settings.email_pool_size,
+        )
+        self._queue = asyncio.Queue()
+        self.owner = os.getpid()
+        
+        entries = await asyncio.get_event_loop().run_in_executor(None, self._load_spool)
+        for entry in entries:
+            self._messages[entry["id"]] = entry
+            self._queue.put_nowait(entry["id"])
+        if entries:
+            logger.info(f"Recovered {len(entries)} queued emails from {self.spool_dir}")
+        
+        self._dispatcher = asyncio.create_task(self._dispatch())
+    
+    async def stop(self):
+        if self._dispatcher:
+            self._dispatcher.cancel()
+            self._dispatcher = None
+        if self._deliveries:
+            await asyncio.wait(self._deliveries, timeout=10)
+        if self.pool:
+            await self.pool.close()
+    
+    async def enqueue(self, contact: dict):
+        entry = {
+            "id": str(uuid.uuid4()),
+            "contact": contact,
+            "attempts": 0,
+            "created_at": time.time()
+        }
+        await asyncio.get_event_loop().run_in_executor(None, self._write_spool, entry)
+        self._messages[entry["id"]] = entry
+        self._recent.append(time.monotonic())
+        self._queue.put_nowait(entry["id"])
+    
+    def _spool_path(self, message_id: str) -> str:
+        return os.path.join(self.spool_dir, f"{message_id}.{self.owner}.json")
+    
+    def _load_spool(self) -> List[dict]:
+        os.makedirs(self.failed_dir, exist_ok=True)
+        entries = []
+        for name in os.listdir(self.spool_dir):
+            if not name.endswith(".json"):
+                continue
+            message_id, _, owner = name[:-len(".json")].partition(".")
+            if owner.isdigit() and int(owner) != self.owner and self._owner_alive(int(owner)):
+                continue
+            # Claim the file; the rename fails if another worker claimed it first
+            path = self._spool_path(message_id)
+            try:
+                os.rename(os.path.join(self.spool_dir, name), path)
+                with open(path, encoding="utf-8") as f:
+                    entries.append(json.load(f))
+            except FileNotFoundError:
+                continue
+            except (OSError, ValueError) as e:
+                logger.error(f"Skipping unreadable spool file {name}: {e}")
+        return sorted(entries, key=lambda entry: entry["created_at"])
+    
+    @staticmethod
+    def _owner_alive(pid: int) -> bool:
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+        return True
+    
+    def _write_spool(self, entry: dict):
+        path = self._spool_path(entry["id"])
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+    
+    def _remove_spool(self, message_id: str, failed: bool = False):
+        path = self._spool_path(message_id)
+        try:
+            if failed:
+                os.replace(path, os.path.join(self.failed_dir, os.path.basename(path)))
+            else:
+                os.remove(path)
+        except FileNotFoundError:
+            pass
+    
+    def _is_spiking(self) -> bool:
+        cutoff = time.monotonic() - 60
+        while self._recent and self._recent[0] < cutoff:
+            self._recent.popleft()
+        return len(self._recent) >= settings.email_digest_threshold
+    
+    async def _dispatch(self):
+        while True:
+            batch = [await self._queue.get()]
+            if self._is_spiking():
+                # Collect submissions for one interval and send them as a single digest
+                await asyncio.sleep(settings.email_digest_interval_seconds)
+                while not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+            
+            task = asyncio.create_task(self._deliver(batch))
+            self._deliveries.add(task)
+            task.add_done_callback(self._deliveries.discard)
+    
+    async def _deliver(self, batch: List[str]):
+        entries = [self._messages[message_id] for message_id in batch if message_id in self._messages]
+        if not entries:
+            return
+        
+        loop = asyncio.get_event_loop()
+        try:
+            # Building is covered too: a template error or bad spool data must not strand the entries
+            contacts = [ContactRequest.construct(**entry["contact"]) for entry in entries]
+            if len(contacts) == 1:
+                message = self.email_service.build_contact_message(contacts[0])
+            else:
+                message = self.email_service.build_digest_message(contacts)
+            await self.pool.send(message)
+        except Exception as e:
+            logger.error(f"Failed to send {len(entries)} queued email(s): {e}")
+            for entry in entries:
+                await self._schedule_retry(entry)
+            return
+        
+        for entry in entries:
+            self._messages.pop(entry["id"], None)
+            await loop.run_in_executor(None, self._remove_spool, entry["id"])
+        logger.info(f"Delivered {len(entries)} queued email(s)")
+    
+    async def _schedule_retry(self, entry: dict):
+        loop = asyncio.get_event_loop()
+        entry["attempts"] += 1
+        if entry["attempts"] >= settings.email_max_retries:
+            logger.error(f"Giving up on email {entry['id']} after {entry['attempts']} attempts")
+            self._messages.pop(entry["id"], None)
+            await loop.run_in_executor(None, self._remove_spool, entry["id"], True)
+            return
+        
+        await loop.run_in_executor(None, self._write_spool, entry)
+        delay = settings.email_retry_base_delay_seconds * 2 ** (entry["attempts"] - 1)
+        loop.call_later(delay, self._queue.put_nowait, entry["id"])
+
 class EmailService:
     def __init__(self):
         self.smtp_host = os.getenv("EMAIL_HOST", "smtp.gmail.com")
         self.smtp_port = int(os.getenv("EMAIL_PORT", "587"))
         self.email_user = os.getenv("EMAIL_USER", "contact@emptymug.fr")
         self.email_password = os.getenv("EMAIL_PASSWORD", "")
-        
+        self.recipient = "contact@emptymug.fr"
+        self._templates: Optional[EmailTemplates] = None
+        self.queue = MailQueue(self, settings.email_spool_dir)
+    
+    @property
+    def templates(self) -> EmailTemplates:
+        # Compiled on first use so importing this module stays cheap
+        if self._templates is None:
+            self._templates = EmailTemplates()
+        return self._templates
+    
+    async def start(self):
+        """Compile the templates and start the background delivery queue"""
+        await asyncio.get_event_loop().run_in_executor(None, lambda: self.templates)
+        await self.queue.start()
+    
+    async def stop(self):
+        """Stop the delivery queue and close pooled SMTP connections"""
+        await self.queue.stop()
+    
     async def send_contact_email(self, contact_data: ContactRequest) -> bool:
-        """Send contact form email to contact@emptymug.fr"""
+        """Queue contact form email to contact@emptymug.fr"""
+        if not self.queue.running:
+            logger.warning("Email queue is not running, contact email not sent")
+            return False
+        
         try:
-            # Create message
-            msg = MIMEMultipart()
-            msg["From"] = self.email_user
-            msg["To"] = "contact@emptymug.fr"
-            msg["Subject"] = f"New Contact Form Submission from {contact_data.fullName}"
-            
-            # Create HTML body
-            html_body = self._create_email_template(contact_data)
-            msg.attach(MIMEText(html_body, "html"))
-            
-            # Send email
-            await aiosmtplib.send(
-                msg,
-                hostname=self.smtp_host,
-                port=self.smtp_port,
-                start_tls=True,
-                username=self.email_user,
-                password=self.email_password,
-            )
-            
-            logger.info(f"Contact email sent successfully for {contact_data.email}")
+            with metrics.stage_duration.time("email"):
+                await self.queue.enqueue(contact_data.dict())
             return True
-            
         except Exception as e:
-            logger.error(f"Failed to send contact email: {str(e)}")
+            logger.error(f"Failed to queue contact email: {str(e)}")
             return False
     
-    def _create_email_template(self, contact_data: ContactRequest) -> str:
-        """Create formatted HTML email template"""
-        phone_info = ""
-        if contact_data.phoneNumber:
-            phone_info = f"""
-            <tr>
-                <td style="padding: 8px 0; font-weight: bold; color: #374151;">Phone:</td>
-                <td style="padding: 8px 0; color: #4b5563;">{contact_data.countryCode} {contact_data.phoneNumber}</td>
-            </tr>
-            """
-        
-        return f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <meta charset="utf-8">
-            <title>New Contact Form Submission</title>
-        </head>
-        <body style="font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif; line-height: 1.6; color: #333; max-width: 600px; margin: 0 auto; padding: 20px;">
-            <div style="background: linear-gradient(135deg, #0ea5e9 0%, #0284c7 100%); padding: 30px; text-align: center; border-radius: 10px 10px 0 0;">
-                <h1 style="color: white; margin: 0; font-size: 28px;">New Contact Form Submission</h1>
-                <p style="color: #e0f2fe; margin: 10px 0 0 0; font-size: 16px;">From EmptyMug Website</p>
-            </div>
-            
-            <div style="background: #fff; padding: 30px; border: 1px solid #e5e7eb; border-top: none; border-radius: 0 0 10px 10px;">
-                <h2 style="color: #1f2937; margin-top: 0; font-size: 22px;">Contact Details</h2>
-                
-                <table style="width: 100%; border-collapse: collapse; margin-bottom: 20px;">
-                    <tr>
-                        <td style="padding: 8px 0; font-weight: bold; color: #374151; width: 100px;">Name:</td>
-                        <td style="padding: 8px 0; color: #4b5563;">{contact_data.fullName}</td>
-                    </tr>
-                    <tr>
-                        <td style="padding: 8px 0; font-weight: bold; color: #374151;">Email:</td>
-                        <td style="padding: 8px 0; color: #4b5563;"><a href="mailto:{contact_data.email}" style="color: #0ea5e9; text-decoration: none;">{contact_data.email}</a></td>
-                    </tr>
-                    {phone_info}
-                </table>
-                
-                <h3 style="color: #1f2937; margin-top: 25px; margin-bottom: 10px; font-size: 18px;">Message</h3>
-                <div style="background: #f9fafb; padding: 20px; border-radius: 8px; border-left: 4px solid #0ea5e9;">
-                    <p style="margin: 0; color: #4b5563; white-space: pre-line;">{contact_data.message}</p>
-                </div>
-                
-                <div style="margin-top: 30px; padding-top: 20px; border-top: 1px solid #e5e7eb; color: #6b7280; font-size: 14px;">
-                    <p style="margin: 0;">This email was sent from the contact form on <strong>emptymug.fr</strong></p>
-                    <p style="margin: 5px 0 0 0;">Please reply directly to this email to respond to the inquiry.</p>
-                </div>
-            </div>
-        </body>
-        </html>
-        """
+    def _build_message(self, subject: str, text_body: str, html_body: str) -> MIMEMultipart:
+        # Plain text first: clients show the last alternative they support
+        msg = MIMEMultipart("alternative")
+        msg["From"] = self.email_user
+        msg["To"] = self.recipient
+        msg["Subject"] = subject
+        msg.attach(MIMEText(text_body, "plain"))
+        msg.attach(MIMEText(html_body, "html"))
+        return msg
+    
+    def build_contact_message(self, contact_data: ContactRequest) -> MIMEMultipart:
+        """Build the notification email for a single submission"""
+        text_body, html_body = self.templates.render_contact(contact_data)
+        return self._build_message(
+            f"New Contact Form Submission from {contact_data.fullName}", text_body, html_body
+        )
+    
+    def build_digest_message(self, contacts: List[ContactRequest]) -> MIMEMultipart:
+        """Build one email summarising several submissions"""
+        text_body, html_body = self.templates.render_digest(contacts)
+        return self._build_message(
+            f"Contact Form Digest: {len(contacts)} new submissions", text_body, html_body
+        )
 
 # Global email service instance
 email_service = EmailService()
@@ -1,16 +1,29 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Header, Query, Response, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import FileResponse, JSONResponse, ORJSONResponse, PlainTextResponse
+import asyncio
+import math
 import os
 import logging
+from typing import List, Optional
 from models import ContactRequest, ContactResponse
 from config import settings
-from database.service import db_service
+from database.service import DatabaseService, db_service
 from services.validation import ValidationService
 from services.content_moderation import content_moderator
+from email_service import email_service
+from services.rate_limit import RateLimitMiddleware, rate_limiter, record_rejection
+from services.idempotency import idempotency_service, IdempotencyConflictError, IdempotencyKeyReuseError
+from services.request_context import RequestIDMiddleware, configure_logging, mask_email
+from services import metrics
+from services.readiness import readiness
+from services.shared_state import shared_state
+from services.health import health_prober
+from services.profiling import ProfilingMiddleware, is_debug_token, profile_store, profiling_enabled
 
 # Configure logging
-logging.basicConfig(level=getattr(logging, settings.log_level))
+configure_logging(settings.log_level, settings.log_format)
 logger = logging.getLogger(__name__)
 
 # Create FastAPI app
@@ -20,7 +33,17 @@ app = FastAPI(
     version="2.0.0"
 )
 
-# Configure CORS
+# Compress large responses such as admin contact listings
+if settings.gzip_minimum_size > 0:
+    app.add_middleware(
+        GZipMiddleware, minimum_size=settings.gzip_minimum_size, compresslevel=settings.gzip_compress_level
+    )
+
+# Throttle submissions before validation and moderation run
+if settings.rate_limit_enabled:
+    app.add_middleware(RateLimitMiddleware, limiter=rate_limiter)
+
+# Configure CORS (added after rate limiting so it also wraps 429 responses)
 origins = settings.cors_origins.split(",")
 app.add_middleware(
     CORSMiddleware,
@@ -28,24 +51,88 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["GET", "POST"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID", "Retry-After"],
 )
 
+# Opt-in request profiling; not installed at all unless configured
+if profiling_enabled():
+    app.add_middleware(
+        ProfilingMiddleware,
+        store=profile_store,
+        sample_rate=settings.profiling_sample_rate,
+        debug_token=settings.profiling_debug_token,
+        path_prefixes=[prefix.strip() for prefix in settings.profiling_path_prefixes.split(",") if prefix.strip()],
+    )
+
+# Outermost: every log line of a request carries its request ID
+app.add_middleware(RequestIDMiddleware)
+
 @app.on_event("startup")
 async def startup_event():
-    """Initialize services on startup"""
+    """Start initializing services in the background.
+    
+    The server accepts connections immediately (/health answers right away);
+    /ready reports when each subsystem is usable.
+    """
     logger.info("Initializing application services...")
-    try:
-        # Initialize database
-        await db_service.initialize()
-        logger.info(f"Database service initialized: {settings.database_type}")
-        
-        # Initialize content moderator
-        await content_moderator.initialize()
-        logger.info("Content moderation service initialized")
-        
-    except Exception as e:
-        logger.error(f"Failed to initialize services: {e}")
-        raise
+    readiness.register("database")
+    readiness.register("moderation")
+    readiness.register("validation")
+    readiness.register("email", critical=False)
+    readiness.register("moderation_warmup", critical=False)
+    metrics.email_queue_depth.set_function(lambda: email_service.queue.depth)
+    shared_state.start()
+    health_prober.start()
+    app.state.initialization = asyncio.create_task(initialize_services())
+
+async def initialize_services():
+    """Initialize the database, moderator, validators and email queue concurrently.
+    
+    Critical subsystems are retried until they come up, so a dependency that
+    is briefly unavailable at boot does not leave the worker serving 503s.
+    """
+    initializers = [
+        readiness.run("database", db_service.initialize, retry=True),
+        initialize_moderation(),
+        readiness.run(
+            "validation",
+            lambda: asyncio.get_event_loop().run_in_executor(None, ValidationService.preload),
+            retry=True
+        ),
+    ]
+    if settings.email_notifications_enabled:
+        initializers.append(readiness.run("email", email_service.start))
+    else:
+        readiness.mark_disabled("email")
+    
+    await asyncio.gather(*initializers)
+    logger.info("Application services initialized", extra={"subsystems": readiness.snapshot()})
+
+async def initialize_moderation():
+    """Build the LLM client, then load the model without holding up readiness"""
+    await readiness.run("moderation", content_moderator.initialize, retry=True)
+    if settings.ollama_warmup_enabled:
+        await readiness.run("moderation_warmup", content_moderator.warm_up)
+    else:
+        readiness.mark_disabled("moderation_warmup")
+
+async def require_ready(*subsystems: str):
+    """Wait for startup initialization, or fail the request with a 503"""
+    if not await readiness.wait(subsystems, settings.readiness_wait_timeout_seconds):
+        raise HTTPException(
+            status_code=503,
+            detail="The service is starting up. Please try again shortly."
+        )
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop background probes and the LLM heartbeat, flush in-flight deliveries and close SMTP connections"""
+    app.state.initialization.cancel()
+    await health_prober.stop()
+    await content_moderator.stop()
+    await shared_state.stop()
+    if readiness.is_ready("email"):
+        await email_service.stop()
 
 @app.get("/")
 async def root():
@@ -54,50 +141,143 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    """Detailed health check"""
-    return {
-        "status": "healthy",
-        "service": "EmptyMug Website API",
-        "version": "2.0.0",
-        "database": settings.database_type
-    }
+    """Health of the API and its dependencies, from the cached background probes.
+    
+    503 only when the database is down; an unreachable LLM is reported as
+    degraded since moderation falls back to rule-based filtering.
+    """
+    snapshot = health_prober.snapshot()
+    return ORJSONResponse(
+        status_code=503 if snapshot["status"] == "unhealthy" else 200,
+        content={
+            "status": snapshot["status"],
+            "service": "EmptyMug Website API",
+            "version": "2.0.0",
+            "database": settings.database_type,
+            "checks": snapshot["checks"]
+        }
+    )
+
+@app.get("/ready")
+async def readiness_check():
+    """Readiness probe: 200 once every critical subsystem is initialized"""
+    is_ready = readiness.ready
+    return JSONResponse(
+        status_code=200 if is_ready else 503,
+        content={"ready": is_ready, "subsystems": readiness.snapshot()}
+    )
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus metrics, summed over all workers when state is shared"""
+    return PlainTextResponse(await shared_state.render_metrics(), media_type=metrics.registry.CONTENT_TYPE)
 
 @app.post("/api/contact", response_model=ContactResponse)
-async def submit_contact_form(contact_data: ContactRequest):
-    """Submit contact form and store in database"""
+async def submit_contact_form(
+    contact_data: ContactRequest,
+    response: Response,
+    background_tasks: BackgroundTasks,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=255)
+):
+    """Submit contact form and store in database.
+    
+    Retries carrying the same Idempotency-Key (or, without one, the same
+    email and message within a short window) return the original result
+    instead of being moderated and stored again.
+    """
+    await require_ready("database", "moderation", "validation")
+    
+    key, ttl_seconds, request_hash = idempotency_service.build_key(idempotency_key, contact_data.dict())
+    try:
+        result, replayed = await idempotency_service.run(
+            key, ttl_seconds, request_hash, lambda: process_contact_submission(contact_data)
+        )
+    except IdempotencyKeyReuseError:
+        metrics.contact_requests.inc("rejected")
+        raise HTTPException(
+            status_code=422,
+            detail="This Idempotency-Key was already used with a different submission."
+        )
+    except IdempotencyConflictError:
+        metrics.contact_requests.inc("conflict")
+        raise HTTPException(
+            status_code=409,
+            detail="A matching submission is still being processed. Please try again shortly."
+        )
+    
+    if replayed:
+        logger.info("Replayed idempotent contact submission", extra={"email": mask_email(contact_data.email)})
+        metrics.cache_requests.inc("idempotency", "hit")
+        metrics.contact_requests.inc("replayed")
+        response.headers["Idempotent-Replayed"] = "true"
+    else:
+        # Queued after the response is sent so delivery never delays the client
+        metrics.cache_requests.inc("idempotency", "miss")
+        metrics.contact_requests.inc("accepted")
+        if settings.email_notifications_enabled:
+            background_tasks.add_task(email_service.send_contact_email, contact_data)
+    return ContactResponse(**result)
+
+async def check_email_rate_limit(email: str):
+    """Charge the per-email bucket; only called for submissions that will actually be processed"""
+    if not settings.rate_limit_enabled:
+        return
+    retry_after = await rate_limiter.check_email(email)
+    if retry_after:
+        record_rejection(retry_after, "email")
+        raise HTTPException(
+            status_code=429,
+            detail="Too many requests. Please try again later.",
+            headers={"Retry-After": str(math.ceil(retry_after))}
+        )
+
+def reject_submission(reason: str, detail: str) -> HTTPException:
+    """Count a rejected submission and build the 400 response for it"""
+    metrics.contact_rejections.inc(reason)
+    metrics.contact_requests.inc("rejected")
+    return HTTPException(status_code=400, detail=detail)
+
+async def process_contact_submission(contact_data: ContactRequest) -> dict:
+    """Validate, moderate and store a contact form submission"""
     try:
-        logger.info(f"Received contact form submission from {contact_data.email}")
+        logger.info("Received contact form submission", extra={"email": mask_email(contact_data.email)})
+        await check_email_rate_limit(contact_data.email)
         
         # Additional validation using validation service
-        is_valid_name, name_msg = ValidationService.validate_name(contact_data.fullName)
-        if not is_valid_name:
-            raise HTTPException(status_code=400, detail=name_msg)
-            
-        is_valid_email, email_msg = ValidationService.validate_email_format(contact_data.email)
-        if not is_valid_email:
-            raise HTTPException(status_code=400, detail=f"Invalid email: {email_msg}")
-            
-        is_valid_phone, phone_msg = ValidationService.validate_phone_number(
-            contact_data.phoneNumber, contact_data.countryCode
-        )
-        if not is_valid_phone:
-            raise HTTPException(status_code=400, detail=f"Invalid phone: {phone_msg}")
-            
-        is_valid_country, country_msg = ValidationService.validate_country_code(contact_data.countryCode)
-        if not is_valid_country:
-            raise HTTPException(status_code=400, detail=country_msg)
-            
-        is_valid_message, message_msg = ValidationService.validate_message(contact_data.message)
-        if not is_valid_message:
-            raise HTTPException(status_code=400, detail=message_msg)
+        with metrics.stage_duration.time("validation"):
+            is_valid_name, name_msg = ValidationService.validate_name(contact_data.fullName)
+            if not is_valid_name:
+                raise reject_submission("invalid_name", name_msg)
+                
+            is_valid_email, email_msg = ValidationService.validate_email_format(contact_data.email)
+            if not is_valid_email:
+                raise reject_submission("invalid_email", f"Invalid email: {email_msg}")
+                
+            is_valid_phone, phone_msg = ValidationService.validate_phone_number(
+                contact_data.phoneNumber, contact_data.countryCode
+            )
+            if not is_valid_phone:
+                raise reject_submission("invalid_phone", f"Invalid phone: {phone_msg}")
+                
+            is_valid_country, country_msg = ValidationService.validate_country_code(contact_data.countryCode)
+            if not is_valid_country:
+                raise reject_submission("invalid_country", country_msg)
+                
+            is_valid_message, message_msg = ValidationService.validate_message(contact_data.message)
+            if not is_valid_message:
+                raise reject_submission("invalid_message", message_msg)
         
         # Content moderation using LLM
-        moderation_result = await content_moderator.moderate_content(contact_data.message)
+        with metrics.stage_duration.time("moderation"):
+            moderation_result = await content_moderator.moderate_content(contact_data.message)
         if not moderation_result.is_clean:
-            logger.warning(f"Content rejected for {contact_data.email}: {moderation_result.message}")
-            raise HTTPException(
-                status_code=400, 
-                detail="Your message contains inappropriate content. Please revise and try again."
+            logger.warning(
+                "Content rejected by moderation",
+                extra={"email": mask_email(contact_data.email), "reason": moderation_result.message}
+            )
+            raise reject_submission(
+                "moderation",
+                "Your message contains inappropriate content. Please revise and try again."
             )
         
         # Store in database
@@ -109,34 +289,60 @@ async def submit_contact_form(contact_data: ContactRequest):
             "message": contact_data.message
         }
         
-        contact_id = await db_service.create_contact(contact_record)
+        with metrics.stage_duration.time("database"), metrics.db_duration.time("create_contact"):
+            contact_id = await db_service.create_contact(contact_record)
         
-        logger.info(f"Contact form stored successfully with ID {contact_id} for {contact_data.email}")
+        logger.info(
+            "Contact form stored",
+            extra={"contact_id": contact_id, "email": mask_email(contact_data.email)}
+        )
         return ContactResponse(
             success=True,
             message="Thank you for your message! We've received your submission and will get back to you soon.",
             contact_id=contact_id
-        )
+        ).dict()
             
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Unexpected error in contact form submission: {str(e)}")
+        metrics.contact_requests.inc("error")
         raise HTTPException(
             status_code=500,
             detail="An unexpected error occurred. Please try again later."
         )
 
-@app.get("/api/contacts")
-async def get_contacts(limit: int = 100, offset: int = 0):
-    """Retrieve contacts (for admin use)"""
+def parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """Validate a comma-separated fields= projection; the contact id is always included"""
+    if not fields:
+        return None
+    requested = {field.strip() for field in fields.split(",") if field.strip()}
+    unknown = requested.difference(DatabaseService.CONTACT_FIELDS)
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown fields: {', '.join(sorted(unknown))}"
+        )
+    return [field for field in DatabaseService.CONTACT_FIELDS if field == "id" or field in requested]
+
+@app.get("/api/contacts", response_class=ORJSONResponse)
+async def get_contacts(
+    limit: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+    fields: Optional[str] = None
+):
+    """Retrieve contacts (for admin use), optionally only the listed fields"""
+    await require_ready("database")
+    projection = parse_fields(fields)
     try:
-        contacts = await db_service.list_contacts(limit=limit, offset=offset)
-        return {
+        with metrics.db_duration.time("list_contacts"):
+            contacts = await db_service.list_contacts(limit=limit, offset=offset, fields=projection)
+        # Returned as a response so the records skip FastAPI's generic encoder
+        return ORJSONResponse({
             "success": True,
             "contacts": contacts,
             "count": len(contacts)
-        }
+        })
     except Exception as e:
         logger.error(f"Error retrieving contacts: {str(e)}")
         raise HTTPException(
@@ -144,18 +350,21 @@ async def get_contacts(limit: int = 100, offset: int = 0):
             detail="Failed to retrieve contacts"
         )
 
-@app.get("/api/contacts/{contact_id}")
-async def get_contact(contact_id: str):
-    """Retrieve a specific contact by ID"""
+@app.get("/api/contacts/{contact_id}", response_class=ORJSONResponse)
+async def get_contact(contact_id: str, fields: Optional[str] = None):
+    """Retrieve a specific contact by ID, optionally only the listed fields"""
+    await require_ready("database")
+    projection = parse_fields(fields)
     try:
-        contact = await db_service.get_contact(contact_id)
+        with metrics.db_duration.time("get_contact"):
+            contact = await db_service.get_contact(contact_id, fields=projection)
         if not contact:
             raise HTTPException(status_code=404, detail="Contact not found")
         
-        return {
+        return ORJSONResponse({
             "success": True,
             "contact": contact
-        }
+        })
     except HTTPException:
         raise
     except Exception as e:
@@ -165,12 +374,43 @@ async def get_contact(contact_id: str):
             detail="Failed to retrieve contact"
         )
 
+def require_debug_token(token: Optional[str]):
+    """Profile endpoints expose stacks and request metadata, so they always need the debug token"""
+    if not settings.profiling_debug_token:
+        raise HTTPException(
+            status_code=403,
+            detail="Profile endpoints are disabled until PROFILING_DEBUG_TOKEN is configured"
+        )
+    if not is_debug_token(token):
+        raise HTTPException(status_code=403, detail="A valid X-Debug-Profile header is required")
+
+@app.get("/api/admin/profiles", response_class=ORJSONResponse)
+async def list_profiles(debug_token: Optional[str] = Header(None, alias="X-Debug-Profile")):
+    """List stored request profiles, newest first"""
+    require_debug_token(debug_token)
+    profiles = await asyncio.get_event_loop().run_in_executor(None, profile_store.list)
+    return ORJSONResponse({
+        "success": True,
+        "profiles": profiles,
+        "count": len(profiles)
+    })
+
+@app.get("/api/admin/profiles/{profile_id}/folded")
+async def get_profile_stacks(profile_id: str, debug_token: Optional[str] = Header(None, alias="X-Debug-Profile")):
+    """Collapsed stacks of a profile, for flamegraph.pl, speedscope or inferno"""
+    require_debug_token(debug_token)
+    path = await asyncio.get_event_loop().run_in_executor(None, profile_store.folded_path, profile_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="text/plain", filename=f"{profile_id}.folded")
+
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request, exc):
     """Custom HTTP exception handler"""
     return JSONResponse(
         status_code=exc.status_code,
-        content={"success": False, "message": exc.detail}
+        content={"success": False, "message": exc.detail},
+        headers=exc.headers
     )
 
 @app.exception_handler(Exception)
@@ -182,12 +422,34 @@ async def general_exception_handler(request, exc):
         content={"success": False, "message": "Internal server error"}
     )
 
-if __name__ == "__main__":
+def run_workers(workers: int):
+    """Serve the app from several worker processes sharing state through SQLite"""
     import uvicorn
-    uvicorn.run(
-        "main:app",
-        host="0.0.0.0",
-        port=8000,
-        reload=True,
-        log_level="info"
-    )
+    from services.shared_state import SQLiteSharedStateStore, shared_sqlite_file
+    
+    # Workers import main again and read their settings from the environment
+    if settings.shared_state_backend == "memory":
+        logger.info("Using SQLite shared state for multiple workers")
+        os.environ["SHARED_STATE_BACKEND"] = "sqlite"
+    if settings.rate_limit_enabled and settings.rate_limit_backend == "memory":
+        logger.info("Using SQLite rate limit buckets for multiple workers")
+        os.environ["RATE_LIMIT_BACKEND"] = "sqlite"
+    if settings.database_type == "memory":
+        logger.warning("The memory database keeps contacts and idempotency keys per worker")
+    
+    # Metric totals start over with each deployment
+    SQLiteSharedStateStore(shared_sqlite_file()).reset_metrics()
+    uvicorn.run("main:app", host="0.0.0.0", port=8000, workers=workers, log_level="info")
+
+if __name__ == "__main__":
+    if settings.workers > 1:
+        run_workers(settings.workers)
+    else:
+        import uvicorn
+        uvicorn.run(
+            "main:app",
+            host="0.0.0.0",
+            port=8000,
+            reload=True,
+            log_level="info"
+        )
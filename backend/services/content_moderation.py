@@ -1,9 +1,12 @@
-from langchain.llms import Ollama
-from langchain.schema import BaseOutputParser
-from typing import Dict, Any
+from typing import Dict, Any, Optional
+import asyncio
+import hashlib
 import re
+import time
 import logging
 from config import settings
+from services import metrics
+from services.shared_state import shared_state
 
 logger = logging.getLogger(__name__)
 
@@ -13,7 +16,7 @@ class ContentModerationResult:
         self.message = message
         self.score = score
 
-class ContentModerationParser(BaseOutputParser):
+class ContentModerationParser:
     """Custom parser for content moderation results"""
     
     def parse(self, text: str) -> ContentModerationResult:
@@ -47,30 +50,111 @@ class ContentModerationParser(BaseOutputParser):
 class LLMContentModerator:
     """LLM-based content moderation service using Ollama"""
     
+    # Static instructions sent as Ollama's system prompt when enabled; the
+    # unchanged prefix stays in the model's prompt cache between requests
+    SYSTEM_PROMPT = (
+        "You are a content moderator. Check the text for profanity, hate speech, "
+        "spam and unprofessional tone. Reply only with JSON: "
+        '{"is_clean": bool, "message": string, "score": float from 0 to 1 where 1 is clean}'
+    )
+    WARMUP_TEXT = "Hello, I would like to know more about your services."
+    
     def __init__(self):
         self.llm = None
         self.parser = ContentModerationParser()
+        self._last_call = 0.0
+        self._heartbeat_task = None
     
     async def initialize(self):
-        """Initialize the LLM connection"""
+        """Initialize the LLM connection and start the keep-alive heartbeat.
+        
+        The model itself is loaded by warm_up, which runs separately so that
+        submissions are accepted while it loads. Raises if the client cannot
+        be created, so startup retries it instead of silently running on the
+        rule-based fallback.
+        """
+        # langchain is slow to import, so it is loaded off the event loop on first use
+        Ollama = await asyncio.get_event_loop().run_in_executor(None, self._import_ollama)
+        self.llm = Ollama(
+            base_url=settings.ollama_host,
+            model=settings.ollama_model,
+            temperature=0.1,  # Low temperature for consistent moderation
+            keep_alive=settings.ollama_keep_alive,
+            system=self.SYSTEM_PROMPT if settings.ollama_system_prompt_enabled else None
+        )
+        logger.info(f"LLM Content Moderator initialized with {settings.ollama_model}")
+        
+        if settings.ollama_heartbeat_interval_seconds > 0:
+            # The first heartbeat is due a full interval from now, after any warm-up
+            self._last_call = time.monotonic()
+            self._heartbeat_task = asyncio.create_task(self._heartbeat())
+    
+    async def stop(self):
+        """Stop the keep-alive heartbeat"""
+        if self._heartbeat_task:
+            self._heartbeat_task.cancel()
+            try:
+                await self._heartbeat_task
+            except asyncio.CancelledError:
+                pass
+            self._heartbeat_task = None
+    
+    @staticmethod
+    def _import_ollama():
+        from langchain_community.llms.ollama import Ollama
+        return Ollama
+    
+    async def warm_up(self):
+        """Load the model with a real moderation prompt so the first request does not pay for it.
+        
+        Raises when the model could not be loaded; moderation still works
+        meanwhile (via a cold load on the first request, or the fallback).
+        """
+        start = time.perf_counter()
         try:
-            self.llm = Ollama(
-                base_url=settings.ollama_host,
-                model=settings.ollama_model,
-                temperature=0.1  # Low temperature for consistent moderation
+            await asyncio.wait_for(
+                self._generate(self._build_prompt(self.WARMUP_TEXT), "warmup"),
+                settings.ollama_warmup_timeout_seconds
             )
-            logger.info(f"LLM Content Moderator initialized with {settings.ollama_model}")
-        except Exception as e:
-            logger.error(f"Failed to initialize LLM: {e}")
-            self.llm = None
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"model not loaded within {settings.ollama_warmup_timeout_seconds:.0f}s")
+        logger.info(f"LLM model {settings.ollama_model} warmed up in {time.perf_counter() - start:.2f}s")
     
-    async def moderate_content(self, text: str) -> ContentModerationResult:
-        """Moderate content using LLM"""
-        if not self.llm:
-            logger.warning("LLM not available, using fallback moderation")
-            return self._fallback_moderation(text)
+    async def _heartbeat(self):
+        """Keep the model resident by pinging Ollama when no request did recently"""
+        interval = settings.ollama_heartbeat_interval_seconds
+        while True:
+            await asyncio.sleep(max(0.0, self._last_call + interval - time.monotonic()))
+            if time.monotonic() - self._last_call < interval:
+                continue
+            try:
+                # An empty prompt makes Ollama load the model (and reset keep_alive) without generating
+                await asyncio.wait_for(self._generate("", "heartbeat"), settings.ollama_warmup_timeout_seconds)
+            except Exception as e:
+                logger.warning(f"LLM heartbeat failed: {e!r}")
+                # Back off for a full interval instead of retrying immediately
+                self._last_call = time.monotonic()
+    
+    async def _generate(self, prompt: str, trigger: str) -> str:
+        """Call the model and record whether it had to be loaded first"""
+        self._last_call = time.monotonic()
+        result = await self.llm.agenerate([prompt])
+        generation = result.generations[0][0]
         
-        prompt = f"""
+        # Ollama reports the time spent loading the model (in nanoseconds)
+        load_duration = (generation.generation_info or {}).get("load_duration")
+        if load_duration is not None:
+            load_seconds = load_duration / 1e9
+            metrics.llm_load_duration.observe(load_seconds, trigger)
+            if load_seconds >= settings.ollama_cold_load_threshold_seconds:
+                metrics.llm_cold_loads.inc(trigger)
+                logger.warning(f"LLM model cold load took {load_seconds:.2f}s ({trigger})")
+        return generation.text
+    
+    def _build_prompt(self, text: str) -> str:
+        if settings.ollama_system_prompt_enabled:
+            return f'Text to analyze: "{text}"\n\nJSON Response:'
+        return f"""
 You are a content moderator. Analyze the following text for:
 1. Profanity and vulgar language
 2. Hate speech or discriminatory content
@@ -86,16 +170,64 @@ Respond with a JSON object containing:
 
 JSON Response:
 """
+    
+    async def moderate_content(self, text: str) -> ContentModerationResult:
+        """Moderate content using LLM"""
+        if not self.llm:
+            logger.warning("LLM not available, using fallback moderation")
+            metrics.moderation_fallbacks.inc("unavailable")
+            return self._fallback_moderation(text)
+        
+        cache_key = self._cache_key(text)
+        cached = await self._cached_verdict(cache_key)
+        if cached is not None:
+            return cached
+        
+        prompt = self._build_prompt(text)
         
+        start = time.perf_counter()
         try:
-            response = await self.llm.ainvoke(prompt)
+            response = await self._generate(prompt, "request")
+            metrics.llm_duration.observe(time.perf_counter() - start, "success")
             result = self.parser.parse(response)
             logger.info(f"Content moderation result: {result.is_clean} - {result.message}")
+            await self._cache_verdict(cache_key, result)
             return result
         except Exception as e:
+            metrics.llm_duration.observe(time.perf_counter() - start, "error")
+            metrics.moderation_fallbacks.inc("error")
             logger.error(f"LLM moderation failed: {e}")
             return self._fallback_moderation(text)
     
+    @staticmethod
+    def _cache_key(text: str) -> str:
+        # Verdicts depend on the model and prompt as well as the text
+        material = f"{settings.ollama_model}\x00{settings.ollama_system_prompt_enabled}\x00{text.strip()}"
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+    
+    async def _cached_verdict(self, cache_key: str) -> Optional[ContentModerationResult]:
+        """Verdict of an earlier identical message, from any worker"""
+        if settings.moderation_cache_ttl_seconds <= 0:
+            return None
+        try:
+            cached = await shared_state.get("moderation", cache_key)
+        except Exception as e:
+            logger.warning(f"Moderation cache lookup failed: {e}")
+            return None
+        metrics.cache_requests.inc("moderation", "miss" if cached is None else "hit")
+        if cached is None:
+            return None
+        return ContentModerationResult(cached["is_clean"], cached["message"], cached["score"])
+    
+    async def _cache_verdict(self, cache_key: str, result: ContentModerationResult):
+        if settings.moderation_cache_ttl_seconds <= 0:
+            return
+        verdict = {"is_clean": result.is_clean, "message": result.message, "score": result.score}
+        try:
+            await shared_state.set("moderation", cache_key, verdict, settings.moderation_cache_ttl_seconds)
+        except Exception as e:
+            logger.warning(f"Failed to cache moderation verdict: {e}")
+    
     def _fallback_moderation(self, text: str) -> ContentModerationResult:
         """Fallback moderation using basic word filtering"""
         prohibited_words = [
@@ -0,0 +1,114 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Optional
+from config import settings
+from database.service import db_service
+from services import metrics
+from services.readiness import readiness
+
+logger = logging.getLogger(__name__)
+
+class HealthProber:
+    """Probes the database and Ollama in the background and caches the result.
+    
+    Load balancers poll /health every few seconds on every replica; serving
+    the cached snapshot keeps that at constant cost however often it is
+    polled, while the dependencies see one probe per interval per worker.
+    """
+    
+    def __init__(self):
+        self._checks = {
+            "database": {"status": "pending"},
+            "llm": {"status": "pending"},
+        }
+        self._snapshot = self._build_snapshot()
+        self._task: Optional[asyncio.Task] = None
+        self._session = None
+    
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._session:
+            await self._session.close()
+            self._session = None
+    
+    def snapshot(self) -> dict:
+        return self._snapshot
+    
+    async def _run(self):
+        # There is no connection to probe until the database is initialized
+        await readiness.wait(["database"], None)
+        while True:
+            await self.probe()
+            await asyncio.sleep(settings.health_probe_interval_seconds)
+    
+    async def probe(self):
+        """Run every probe concurrently and publish a new snapshot"""
+        await asyncio.gather(
+            self._check("database", self._probe_database),
+            self._check("llm", self._probe_llm),
+        )
+        self._snapshot = self._build_snapshot()
+    
+    async def _check(self, name: str, probe):
+        start = time.perf_counter()
+        try:
+            detail = await asyncio.wait_for(probe(), settings.health_probe_timeout_seconds)
+        except Exception as e:
+            latency = time.perf_counter() - start
+            if self._checks[name]["status"] != "down":
+                logger.warning(f"Health probe for {name} failed: {type(e).__name__}: {e}")
+            check = {"status": "down", "error": f"{type(e).__name__}: {e}"}
+        else:
+            latency = time.perf_counter() - start
+            check = {"status": "up", **detail}
+        check["latency_ms"] = round(latency * 1000, 1)
+        check["checked_at"] = datetime.now(timezone.utc).isoformat()
+        self._checks[name] = check
+        metrics.dependency_up.set(1 if check["status"] == "up" else 0, name)
+        metrics.dependency_probe_duration.observe(latency, name)
+    
+    async def _probe_database(self) -> dict:
+        if not readiness.is_ready("database"):
+            raise RuntimeError("database initialization failed")
+        await db_service.ping()
+        return {"backend": settings.database_type}
+    
+    async def _probe_llm(self) -> dict:
+        import aiohttp
+        
+        if self._session is None:
+            self._session = aiohttp.ClientSession()
+        async with self._session.get(f"{settings.ollama_host}/api/tags") as response:
+            response.raise_for_status()
+            tags = await response.json(content_type=None)
+        models = {model.get("name", "") for model in tags.get("models", [])}
+        model = settings.ollama_model
+        return {"model": model, "model_available": model in models or f"{model}:latest" in models}
+    
+    def _build_snapshot(self) -> dict:
+        database = self._checks["database"]["status"]
+        llm = self._checks["llm"]["status"]
+        if database == "down":
+            status = "unhealthy"
+        elif database == "pending":
+            status = "starting"
+        elif llm != "up":
+            # Submissions still work with the rule-based moderation fallback
+            status = "degraded"
+        else:
+            status = "healthy"
+        return {"status": status, "checks": {name: dict(check) for name, check in self._checks.items()}}
+
+# Global health prober instance
+health_prober = HealthProber()
@@ -0,0 +1,142 @@
+import asyncio
+import hashlib
+import json
+import logging
+import math
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+from config import settings
+from database.service import db_service
+from services import metrics
+
+logger = logging.getLogger(__name__)
+
+class IdempotencyConflictError(Exception):
+    """Raised when a duplicate request gives up waiting for the original one"""
+
+class IdempotencyKeyReuseError(Exception):
+    """Raised when an Idempotency-Key is sent again with a different payload"""
+
+class IdempotencyService:
+    """Deduplicates contact submissions by Idempotency-Key or content hash.
+    
+    Duplicates inside this process wait on the in-flight future; duplicates
+    handled by another worker are resolved through the database store, which
+    only lets one caller claim a key.
+    """
+    
+    POLL_INTERVAL = 0.25
+    
+    def __init__(self, db_service):
+        self.db_service = db_service
+        # key -> (future, request hash) of requests running in this process
+        self._inflight: Dict[str, Tuple[asyncio.Future, Optional[str]]] = {}
+    
+    @staticmethod
+    def build_key(
+        idempotency_key: Optional[str], payload: dict
+    ) -> Tuple[str, int, Optional[str]]:
+        """Return the store key, its TTL and the request hash for a submission.
+        
+        A client key is bound to a hash of the whole payload so that reusing
+        it for a different submission is an error rather than a replay;
+        content keys are the hash of email and message themselves.
+        """
+        if idempotency_key:
+            request_hash = hashlib.sha256(
+                json.dumps(payload, sort_keys=True, separators=(",", ":")).encode("utf-8")
+            ).hexdigest()
+            return f"key:{idempotency_key}", settings.idempotency_ttl_seconds, request_hash
+        
+        digest = hashlib.sha256(
+            f"{payload['email'].strip().lower()}\n{payload['message'].strip()}".encode("utf-8")
+        ).hexdigest()
+        return f"content:{digest}", settings.idempotency_content_window_seconds, None
+    
+    async def run(
+        self, key: str, ttl_seconds: int, request_hash: Optional[str],
+        handler: Callable[[], Awaitable[dict]]
+    ) -> Tuple[dict, bool]:
+        """Run handler once per key; returns (response, replayed)"""
+        inflight = self._inflight.get(key)
+        if inflight:
+            self._check_request_hash(key, inflight[1], request_hash)
+            return await asyncio.shield(inflight[0]), True
+        
+        future = asyncio.get_event_loop().create_future()
+        self._inflight[key] = (future, request_hash)
+        try:
+            response, replayed = await self._run_claimed(key, ttl_seconds, request_hash, handler)
+            future.set_result(response)
+            return response, replayed
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved when nobody else is waiting on it
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+    
+    @staticmethod
+    def _check_request_hash(key: str, stored: Optional[str], request_hash: Optional[str]):
+        if stored != request_hash:
+            raise IdempotencyKeyReuseError(key)
+    
+    async def _run_claimed(
+        self, key: str, ttl_seconds: int, request_hash: Optional[str],
+        handler: Callable[[], Awaitable[dict]]
+    ) -> Tuple[dict, bool]:
+        # A pending claim only holds a short lease so a crashed worker cannot block retries;
+        # the lease is renewed for as long as the handler runs
+        lease_seconds = math.ceil(settings.idempotency_wait_timeout_seconds) + 1
+        with metrics.db_duration.time("claim_idempotency_key"):
+            existing = await self.db_service.claim_idempotency_key(key, lease_seconds, request_hash)
+        if existing:
+            self._check_request_hash(key, existing.get("request_hash"), request_hash)
+            return await self._wait_for_completion(key, existing), True
+        
+        renewal = asyncio.create_task(self._renew_lease(key, lease_seconds))
+        try:
+            response = await handler()
+        except BaseException:
+            renewal.cancel()
+            with metrics.db_duration.time("release_idempotency_key"):
+                await self.db_service.release_idempotency_key(key)
+            raise
+        renewal.cancel()
+        
+        try:
+            with metrics.db_duration.time("complete_idempotency_key"):
+                await self.db_service.complete_idempotency_key(key, response, ttl_seconds, request_hash)
+        except Exception as e:
+            # The submission itself succeeded; only deduplication of later retries is lost
+            logger.error(f"Failed to store idempotency result for {key}: {e}")
+        return response, False
+    
+    async def _renew_lease(self, key: str, lease_seconds: int):
+        """Keep a pending claim from expiring while its request is still being processed"""
+        while True:
+            await asyncio.sleep(lease_seconds / 3)
+            try:
+                with metrics.db_duration.time("extend_idempotency_key"):
+                    await self.db_service.extend_idempotency_key(key, lease_seconds)
+            except Exception as e:
+                # The next renewal may still succeed before the lease runs out
+                logger.warning(f"Failed to extend idempotency lease for {key}: {e}")
+    
+    async def _wait_for_completion(self, key: str, record: dict) -> dict:
+        loop = asyncio.get_event_loop()
+        deadline = loop.time() + settings.idempotency_wait_timeout_seconds
+        while record and record["status"] != "completed":
+            if loop.time() >= deadline:
+                raise IdempotencyConflictError(key)
+            await asyncio.sleep(self.POLL_INTERVAL)
+            with metrics.db_duration.time("get_idempotency_key"):
+                record = await self.db_service.get_idempotency_key(key)
+        
+        if not record:
+            # The original request failed and released the key
+            raise IdempotencyConflictError(key)
+        return record["response"]
+
+# Global idempotency service instance
+idempotency_service = IdempotencyService(db_service)
@@ -0,0 +1,262 @@
+import asyncio
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from services.request_context import stage_timeline_var, stage_timings_var
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(labelnames: Sequence[str], labelvalues: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, labelvalues)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+class Counter:
+    """Monotonic counter, optionally split by label values"""
+    
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+    
+    def inc(self, *labelvalues: str, amount: float = 1.0):
+        self._values[labelvalues] = self._values.get(labelvalues, 0.0) + amount
+    
+    def value(self, *labelvalues: str) -> float:
+        return self._values.get(labelvalues, 0.0)
+    
+    def snapshot(self) -> list:
+        return [[list(labelvalues), value] for labelvalues, value in self._values.items()]
+    
+    def merge(self, snapshots: Sequence[Tuple[dict, bool]]) -> Dict[Tuple[str, ...], float]:
+        """Sum the values of several workers' registry snapshots"""
+        values: Dict[Tuple[str, ...], float] = {}
+        for snapshot, _live in snapshots:
+            for labelvalues, value in snapshot.get(self.name, ()):
+                values[tuple(labelvalues)] = values.get(tuple(labelvalues), 0.0) + value
+        return values
+    
+    def render(self, values: Optional[Dict[Tuple[str, ...], float]] = None) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for labelvalues, value in (self._values if values is None else values).items():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labelvalues)} {_format_value(value)}")
+        return lines
+
+class Gauge(Counter):
+    """Value that can go up and down.
+    
+    Across workers the live values are summed (queue depths and the like);
+    aggregate="min" or "max" suits per-worker states such as 0/1 flags.
+    """
+    
+    def __init__(
+        self, name: str, documentation: str, labelnames: Sequence[str] = (), aggregate: str = "sum"
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.aggregate = aggregate
+        self._function = None
+    
+    def set(self, value: float, *labelvalues: str):
+        self._values[labelvalues] = value
+    
+    def set_function(self, function: Callable[[], float]):
+        """Read the (unlabelled) value from function whenever the gauge is exported"""
+        self._function = function
+    
+    def snapshot(self) -> list:
+        if self._function is not None:
+            self._values[()] = self._function()
+        return super().snapshot()
+    
+    def merge(self, snapshots: Sequence[Tuple[dict, bool]]) -> Dict[Tuple[str, ...], float]:
+        # Only workers that are still running contribute their current value
+        live_snapshots = [(snapshot, live) for snapshot, live in snapshots if live]
+        if self.aggregate == "sum":
+            return super().merge(live_snapshots)
+        combine = min if self.aggregate == "min" else max
+        values: Dict[Tuple[str, ...], float] = {}
+        for snapshot, _live in live_snapshots:
+            for labelvalues, value in snapshot.get(self.name, ()):
+                key = tuple(labelvalues)
+                values[key] = combine(values[key], value) if key in values else value
+        return values
+    
+    def render(self, values: Optional[Dict[Tuple[str, ...], float]] = None) -> List[str]:
+        if values is None and self._function is not None:
+            self._values[()] = self._function()
+        lines = super().render(values)
+        lines[1] = f"# TYPE {self.name} gauge"
+        return lines
+
+class _Timer:
+    __slots__ = ("histogram", "labelvalues", "start")
+    
+    def __init__(self, histogram: "Histogram", labelvalues: Tuple[str, ...]):
+        self.histogram = histogram
+        self.labelvalues = labelvalues
+    
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labelvalues)
+        return False
+
+class Histogram:
+    """Latency histogram with fixed buckets (in seconds)"""
+    
+    DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+    
+    def __init__(
+        self, name: str, documentation: str, labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS, server_timing: Optional[str] = None
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # Prefix under which observations appear in the request's Server-Timing header
+        self.server_timing = server_timing
+        # labelvalues -> [per-bucket counts..., +Inf count, sum]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+    
+    def observe(self, value: float, *labelvalues: str):
+        state = self._values.get(labelvalues)
+        if state is None:
+            state = self._values[labelvalues] = [0] * (len(self.buckets) + 1) + [0.0]
+        state[bisect_left(self.buckets, value)] += 1
+        state[-1] += value
+        
+        if self.server_timing is not None:
+            timings = stage_timings_var.get()
+            if timings is not None:
+                name = self.server_timing + "_".join(labelvalues)
+                timings[name] = timings.get(name, 0.0) + value
+            timeline = stage_timeline_var.get()
+            if timeline is not None:
+                task = asyncio.current_task()
+                timeline.append((
+                    self.server_timing + "_".join(labelvalues),
+                    time.perf_counter() - value,
+                    value,
+                    task.get_name() if task else "",
+                ))
+    
+    def time(self, *labelvalues: str) -> _Timer:
+        return _Timer(self, labelvalues)
+    
+    def snapshot(self) -> list:
+        return [[list(labelvalues), state] for labelvalues, state in self._values.items()]
+    
+    def merge(self, snapshots: Sequence[Tuple[dict, bool]]) -> Dict[Tuple[str, ...], List[float]]:
+        """Add up the bucket counts and sums of several workers' registry snapshots"""
+        values: Dict[Tuple[str, ...], List[float]] = {}
+        for snapshot, _live in snapshots:
+            for labelvalues, state in snapshot.get(self.name, ()):
+                merged = values.setdefault(tuple(labelvalues), [0] * len(state))
+                for i, value in enumerate(state):
+                    merged[i] += value
+        return values
+    
+    def render(self, values: Optional[Dict[Tuple[str, ...], List[float]]] = None) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labelvalues, state in (self._values if values is None else values).items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), state[:-1]):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(self.labelnames, labelvalues, le)} {cumulative}"
+                )
+            labels = _format_labels(self.labelnames, labelvalues)
+            lines.append(f"{self.name}_sum{labels} {_format_value(state[-1])}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+class MetricsRegistry:
+    """In-process metrics rendered in the Prometheus text exposition format"""
+    
+    CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+    
+    def __init__(self):
+        self._metrics = []
+    
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+    
+    def snapshot(self) -> dict:
+        """JSON-serialisable values of every metric, for merging across workers"""
+        return {metric.name: metric.snapshot() for metric in self._metrics}
+    
+    def fold(self, snapshots: Sequence[dict]) -> dict:
+        """Combine snapshots of exited workers into one: counters and histograms add up, gauges are dropped"""
+        pairs = [(snapshot, False) for snapshot in snapshots]
+        return {
+            metric.name: [[list(labelvalues), value] for labelvalues, value in metric.merge(pairs).items()]
+            for metric in self._metrics
+        }
+    
+    def render(self, snapshots: Optional[Sequence[Tuple[dict, bool]]] = None) -> str:
+        """Render this process's metrics, or the sum of (snapshot, live) pairs from several workers"""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render(None if snapshots is None else metric.merge(snapshots)))
+        return "\n".join(lines) + "\n"
+
+# Global metrics registry and instruments
+registry = MetricsRegistry()
+
+contact_requests = registry.register(Counter(
+    "emptymug_contact_requests_total", "Contact form submissions by outcome", ["outcome"]
+))
+contact_rejections = registry.register(Counter(
+    "emptymug_contact_rejections_total", "Rejected contact form submissions by reason", ["reason"]
+))
+stage_duration = registry.register(Histogram(
+    "emptymug_contact_stage_duration_seconds", "Time spent in each contact submission stage", ["stage"],
+    server_timing=""
+))
+db_duration = registry.register(Histogram(
+    "emptymug_db_operation_duration_seconds", "Database call latency", ["operation"],
+    server_timing="db_"
+))
+llm_duration = registry.register(Histogram(
+    "emptymug_llm_request_duration_seconds", "LLM moderation call latency", ["outcome"],
+    server_timing="llm_"
+))
+llm_load_duration = registry.register(Histogram(
+    "emptymug_llm_model_load_duration_seconds", "Model load time reported by Ollama", ["trigger"]
+))
+llm_cold_loads = registry.register(Counter(
+    "emptymug_llm_cold_loads_total", "LLM calls that waited for the model to be loaded", ["trigger"]
+))
+moderation_fallbacks = registry.register(Counter(
+    "emptymug_moderation_fallback_total", "Moderations served by the rule-based fallback", ["reason"]
+))
+smtp_duration = registry.register(Histogram(
+    "emptymug_smtp_send_duration_seconds", "SMTP send latency", ["outcome"]
+))
+cache_requests = registry.register(Counter(
+    "emptymug_cache_requests_total", "Cache lookups by cache and result", ["cache", "result"]
+))
+email_queue_depth = registry.register(Gauge(
+    "emptymug_email_queue_depth", "Emails waiting for delivery"
+))
+dependency_up = registry.register(Gauge(
+    "emptymug_dependency_up", "Whether the last background health probe succeeded", ["dependency"],
+    # Every worker probes on its own; report 0 if any of them sees the dependency down
+    aggregate="min"
+))
+dependency_probe_duration = registry.register(Histogram(
+    "emptymug_dependency_probe_duration_seconds", "Background health probe round-trip time", ["dependency"]
+))
@@ -0,0 +1,241 @@
+import asyncio
+import hmac
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+from typing import List, Optional, Sequence
+from config import settings
+from services.request_context import request_id_var, stage_timeline_var
+
+logger = logging.getLogger(__name__)
+
+DEBUG_HEADER = b"x-debug-profile"
+
+# Running task per event loop, as maintained by asyncio
+_CURRENT_TASKS = getattr(asyncio.tasks, "_current_tasks", {})
+
+class ProfileSession:
+    """Stack samples and stage timeline of one profiled request"""
+    
+    def __init__(self, method: str, path: str, trigger: str):
+        self.id = f"{datetime.now(timezone.utc):%Y%m%dT%H%M%S%f}-{uuid.uuid4().hex[:8]}"
+        self.method = method
+        self.path = path
+        self.trigger = trigger
+        self.request_id = request_id_var.get()
+        self.started_at = time.perf_counter()
+        self.duration = 0.0
+        self.status = None
+        self.samples: Counter = Counter()
+        self.timeline = []
+    
+    def metadata(self) -> dict:
+        return {
+            "id": self.id,
+            "request_id": self.request_id,
+            "method": self.method,
+            "path": self.path,
+            "status": self.status,
+            "trigger": self.trigger,
+            "duration_ms": round(self.duration * 1000, 3),
+            "samples": sum(self.samples.values()),
+            "interval_ms": settings.profiling_interval_ms,
+            # Stages of the request (and tasks it spawned) in start order, relative to the request start
+            "timeline": [
+                {
+                    "stage": name,
+                    "task": task,
+                    "start_ms": round((start - self.started_at) * 1000, 3),
+                    "duration_ms": round(seconds * 1000, 3),
+                }
+                for name, start, seconds, task in sorted(self.timeline, key=lambda entry: entry[1])
+            ],
+        }
+    
+    def folded(self) -> str:
+        """Samples in the collapsed stack format read by flamegraph.pl, speedscope and inferno"""
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+class StackSampler:
+    """Samples the event loop thread's Python stack while any profile session is active.
+    
+    The thread only exists while a profiled request is in flight. All
+    requests share the event loop, so a session's samples also include
+    whatever other tasks were running; each stack is rooted at the name of
+    the asyncio task that was executing to tell them apart.
+    """
+    
+    def __init__(self):
+        self._sessions = set()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._loop = None
+        self._loop_thread_id = None
+    
+    def add(self, session: ProfileSession):
+        with self._lock:
+            self._sessions.add(session)
+            if self._thread is None:
+                self._loop = asyncio.get_running_loop()
+                self._loop_thread_id = threading.get_ident()
+                self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+                self._thread.start()
+    
+    def remove(self, session: ProfileSession):
+        with self._lock:
+            self._sessions.discard(session)
+    
+    def _run(self):
+        interval = settings.profiling_interval_ms / 1000
+        while True:
+            time.sleep(interval)
+            with self._lock:
+                if not self._sessions:
+                    self._thread = None
+                    return
+                sessions = list(self._sessions)
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            stack = self._collapse(frame)
+            for session in sessions:
+                session.samples[stack] += 1
+    
+    def _collapse(self, frame) -> str:
+        frames = []
+        while frame is not None:
+            code = frame.f_code
+            filename = "/".join(code.co_filename.replace("\\", "/").rsplit("/", 2)[-2:])
+            frames.append(f"{code.co_name} ({filename}:{code.co_firstlineno})")
+            frame = frame.f_back
+        # Read from another thread, so this may be a task switch late; fine for sampling
+        task = _CURRENT_TASKS.get(self._loop)
+        frames.append(f"task:{task.get_name()}" if task is not None else "idle")
+        return ";".join(reversed(frames))
+
+class ProfileStore:
+    """Ring of the most recent profiles in a local directory.
+    
+    Each profile is a <id>.folded file (collapsed stacks) and a <id>.json
+    file with the request metadata and stage timeline; ids sort by time, so
+    the oldest profiles are removed once max_profiles is exceeded.
+    """
+    
+    def __init__(self, directory: str, max_profiles: int):
+        self.directory = directory
+        self.max_profiles = max_profiles
+    
+    def save(self, session: ProfileSession):
+        os.makedirs(self.directory, exist_ok=True)
+        stem = os.path.join(self.directory, session.id)
+        with open(f"{stem}.folded", "w", encoding="utf-8") as f:
+            f.write(session.folded())
+        # The metadata file is written last, so a listed profile is always complete
+        with open(f"{stem}.json.tmp", "w", encoding="utf-8") as f:
+            json.dump(session.metadata(), f)
+        os.replace(f"{stem}.json.tmp", f"{stem}.json")
+        self._prune()
+    
+    def _ids(self) -> List[str]:
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return sorted(name[:-len(".json")] for name in names if name.endswith(".json"))
+    
+    def _prune(self):
+        ids = self._ids()
+        for profile_id in ids[:max(0, len(ids) - self.max_profiles)]:
+            for suffix in (".json", ".folded"):
+                try:
+                    os.remove(os.path.join(self.directory, profile_id + suffix))
+                except FileNotFoundError:
+                    pass
+    
+    def list(self) -> List[dict]:
+        """Metadata of every stored profile, newest first"""
+        profiles = []
+        for profile_id in reversed(self._ids()):
+            try:
+                with open(os.path.join(self.directory, f"{profile_id}.json"), encoding="utf-8") as f:
+                    profiles.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return profiles
+    
+    def folded_path(self, profile_id: str) -> Optional[str]:
+        if profile_id not in self._ids():
+            return None
+        return os.path.join(self.directory, f"{profile_id}.folded")
+
+class ProfilingMiddleware:
+    """ASGI middleware that profiles a sample of requests, or those carrying the debug token.
+    
+    Only installed when profiling is configured; for requests that are not
+    selected the cost is one random() call and, with a debug token set, a
+    scan of the request headers.
+    """
+    
+    def __init__(self, app, store: ProfileStore, sample_rate: float, debug_token: str,
+                 path_prefixes: Sequence[str]):
+        self.app = app
+        self.store = store
+        self.sample_rate = sample_rate
+        self.debug_token = debug_token.encode("latin-1")
+        self.path_prefixes = tuple(path_prefixes)
+        self.sampler = StackSampler()
+    
+    async def __call__(self, scope, receive, send):
+        trigger = self._trigger(scope) if scope["type"] == "http" else None
+        if trigger is None:
+            await self.app(scope, receive, send)
+            return
+        
+        session = ProfileSession(scope["method"], scope["path"], trigger)
+        
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                session.status = message["status"]
+            await send(message)
+        
+        token = stage_timeline_var.set(session.timeline)
+        self.sampler.add(session)
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            self.sampler.remove(session)
+            session.duration = time.perf_counter() - session.started_at
+            stage_timeline_var.reset(token)
+            try:
+                await asyncio.get_event_loop().run_in_executor(None, self.store.save, session)
+            except OSError as e:
+                logger.error(f"Failed to write profile {session.id}: {e}")
+    
+    def _trigger(self, scope) -> Optional[str]:
+        if not scope["path"].startswith(self.path_prefixes):
+            return None
+        if self.debug_token:
+            for name, value in scope["headers"]:
+                if name == DEBUG_HEADER:
+                    return "header" if hmac.compare_digest(value, self.debug_token) else None
+        if self.sample_rate and random.random() < self.sample_rate:
+            return "sampled"
+        return None
+
+def is_debug_token(value: Optional[str]) -> bool:
+    """Constant-time check of a debug header value against the configured token"""
+    token = settings.profiling_debug_token.encode("latin-1")
+    return bool(token) and value is not None and hmac.compare_digest(value.encode("latin-1"), token)
+
+def profiling_enabled() -> bool:
+    return settings.profiling_sample_rate > 0 or bool(settings.profiling_debug_token)
+
+# Global profile store
+profile_store = ProfileStore(settings.profiling_dir, settings.profiling_max_profiles)
@@ -0,0 +1,196 @@
+import json
+import logging
+import math
+import time
+from collections import OrderedDict
+from typing import Iterable, Optional, Tuple
+from config import settings
+from services import metrics
+from services.shared_state import SQLiteFile, shared_sqlite_file
+
+logger = logging.getLogger(__name__)
+
+class InMemoryRateLimitStore:
+    """Token buckets for a single process.
+    
+    Each bucket is a (tokens, updated_at, full_at) tuple, kept in update
+    order. A bucket that has refilled completely carries no information, so
+    it is dropped by a periodic sweep; past max_keys the least recently
+    updated buckets are evicted one by one.
+    """
+    
+    SWEEP_INTERVAL = 60.0
+    
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float, float]]" = OrderedDict()
+        self._next_sweep = 0.0
+    
+    def take(self, key: str, capacity: int, refill_rate: float) -> float:
+        """Consume one token; returns 0 if allowed, else seconds until a token is available"""
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        tokens = capacity if bucket is None else min(capacity, bucket[0] + (now - bucket[1]) * refill_rate)
+        
+        retry_after = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            retry_after = (1 - tokens) / refill_rate
+        self._buckets[key] = (tokens, now, now + (capacity - tokens) / refill_rate)
+        self._buckets.move_to_end(key)
+        
+        if now >= self._next_sweep:
+            self._sweep(now)
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return retry_after
+    
+    def _sweep(self, now: float):
+        self._next_sweep = now + self.SWEEP_INTERVAL
+        self._buckets = OrderedDict(
+            (key, bucket) for key, bucket in self._buckets.items() if bucket[2] > now
+        )
+
+class SQLiteRateLimitStore:
+    """Token buckets in the shared SQLite file, so limits hold across all workers on a host"""
+    
+    SWEEP_INTERVAL = 60.0
+    
+    def __init__(self, file: SQLiteFile):
+        self.file = file
+        self._conn = file.conn
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS rate_limit_buckets ("
+            "key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL, full_at REAL NOT NULL"
+            ") WITHOUT ROWID"
+        )
+        self._next_sweep = 0.0
+    
+    def take(self, key: str, capacity: int, refill_rate: float) -> float:
+        """Consume one token; returns 0 if allowed, else seconds until a token is available"""
+        now = time.time()
+        conn = self._conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT tokens, updated_at FROM rate_limit_buckets WHERE key = ?", (key,)
+            ).fetchone()
+            tokens = capacity if row is None else min(capacity, row[0] + (now - row[1]) * refill_rate)
+            
+            retry_after = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                retry_after = (1 - tokens) / refill_rate
+            conn.execute(
+                "INSERT OR REPLACE INTO rate_limit_buckets (key, tokens, updated_at, full_at) VALUES (?, ?, ?, ?)",
+                (key, tokens, now, now + (capacity - tokens) / refill_rate)
+            )
+            
+            if now >= self._next_sweep:
+                self._next_sweep = now + self.SWEEP_INTERVAL
+                conn.execute("DELETE FROM rate_limit_buckets WHERE full_at <= ?", (now,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return retry_after
+
+class RateLimiter:
+    """Per-IP and per-email token bucket limits for contact submissions"""
+    
+    def __init__(self, store):
+        self.store = store
+        self._sqlite: Optional[SQLiteFile] = store.file if isinstance(store, SQLiteRateLimitStore) else None
+    
+    async def _take(self, key: str, capacity: int, window_seconds: int) -> float:
+        refill_rate = capacity / window_seconds
+        if self._sqlite is None:
+            return self.store.take(key, capacity, refill_rate)
+        return await self._sqlite.call(self.store.take, key, capacity, refill_rate)
+    
+    async def check_ip(self, ip: str) -> float:
+        return await self._take(
+            f"ip:{ip}", settings.rate_limit_ip_requests, settings.rate_limit_ip_window_seconds
+        )
+    
+    async def check_email(self, email: str) -> float:
+        return await self._take(
+            f"email:{email.strip().lower()}",
+            settings.rate_limit_email_requests,
+            settings.rate_limit_email_window_seconds
+        )
+
+def record_rejection(retry_after: float, reason: str):
+    """Log and count a submission rejected by the per-IP or per-email limit"""
+    logger.warning("Rate limit exceeded", extra={"limit": reason, "retry_after": round(retry_after, 1)})
+    metrics.contact_rejections.inc(f"rate_limit_{reason}")
+    metrics.contact_requests.inc("rate_limited")
+
+class RateLimitMiddleware:
+    """ASGI middleware that throttles submissions by client IP before the body is read.
+    
+    The per-email limit is checked by the endpoint instead, once the
+    submission has claimed its idempotency key, so replayed retries are not
+    charged for it.
+    """
+    
+    def __init__(self, app, limiter: RateLimiter, paths: Iterable[str] = ("/api/contact",)):
+        self.app = app
+        self.limiter = limiter
+        self.paths = frozenset(paths)
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+        
+        retry_after = await self.limiter.check_ip(self._client_ip(scope))
+        if retry_after:
+            await self._reject(send, retry_after)
+            return
+        
+        await self.app(scope, receive, send)
+    
+    @staticmethod
+    def _client_ip(scope) -> str:
+        if settings.rate_limit_trust_proxy_headers:
+            # Proxies append to X-Forwarded-For, so only the entries added by the
+            # trusted hops on the right are reliable; anything left of them is
+            # whatever the client sent
+            entries = [
+                entry.strip()
+                for name, value in scope["headers"] if name == b"x-forwarded-for"
+                for entry in value.decode("latin-1").split(",") if entry.strip()
+            ]
+            if entries:
+                return entries[max(0, len(entries) - settings.rate_limit_trusted_proxy_hops)]
+        client = scope.get("client")
+        return client[0] if client else "unknown"
+    
+    @staticmethod
+    async def _reject(send, retry_after: float):
+        record_rejection(retry_after, "ip")
+        payload = json.dumps({
+            "success": False,
+            "message": "Too many requests. Please try again later."
+        }).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(payload)).encode("latin-1")),
+                (b"retry-after", str(math.ceil(retry_after)).encode("latin-1")),
+            ],
+        })
+        await send({"type": "http.response.body", "body": payload})
+
+def create_rate_limiter() -> RateLimiter:
+    if settings.rate_limit_backend == "sqlite":
+        return RateLimiter(SQLiteRateLimitStore(shared_sqlite_file()))
+    return RateLimiter(InMemoryRateLimitStore(settings.rate_limit_max_keys))
+
+# Global rate limiter instance
+rate_limiter = create_rate_limiter()
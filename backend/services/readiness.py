@@ -0,0 +1,89 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Iterable
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+class Readiness:
+    """Tracks the initialization state of each subsystem.
+    
+    Subsystems are initialized concurrently in the background; requests that
+    need one wait for it, while /ready reports the per-subsystem state.
+    """
+    
+    def __init__(self):
+        self._subsystems: Dict[str, dict] = {}
+        self._events: Dict[str, asyncio.Event] = {}
+        self._critical = set()
+    
+    def register(self, name: str, critical: bool = True):
+        self._subsystems[name] = {"status": "pending"}
+        self._events[name] = asyncio.Event()
+        if critical:
+            self._critical.add(name)
+    
+    def mark_disabled(self, name: str):
+        self._subsystems[name] = {"status": "disabled"}
+        self._events[name].set()
+    
+    async def run(self, name: str, initializer: Callable[[], Awaitable], retry: bool = False):
+        """Run a subsystem initializer and record its outcome and duration.
+        
+        With retry, a failed initializer is run again with exponential
+        backoff until it succeeds; the subsystem reports "retrying" (and
+        requests needing it get a 503) in the meantime.
+        """
+        start = time.perf_counter()
+        delay = settings.startup_retry_initial_seconds
+        attempts = 0
+        while True:
+            attempts += 1
+            try:
+                await initializer()
+            except Exception as e:
+                if not retry:
+                    logger.error(f"Failed to initialize {name}: {e}")
+                    self._subsystems[name] = {"status": "failed", "error": str(e)}
+                    break
+                logger.error(f"Failed to initialize {name} (attempt {attempts}), retrying in {delay:.0f}s: {e}")
+                self._subsystems[name] = {"status": "retrying", "error": str(e), "attempts": attempts}
+                # Waiting requests fail fast instead of holding on for the whole backoff
+                self._events[name].set()
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, settings.startup_retry_max_seconds)
+            else:
+                self._subsystems[name] = {"status": "ready"}
+                if attempts > 1:
+                    logger.info(f"Initialized {name} after {attempts} attempts")
+                    self._subsystems[name]["attempts"] = attempts
+                break
+        self._subsystems[name]["duration_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        self._events[name].set()
+    
+    def is_ready(self, name: str) -> bool:
+        return self._subsystems.get(name, {}).get("status") in ("ready", "disabled")
+    
+    @property
+    def ready(self) -> bool:
+        return all(self.is_ready(name) for name in self._critical)
+    
+    async def wait(self, names: Iterable[str], timeout: float) -> bool:
+        """Wait until the named subsystems finished initializing; True if all are usable"""
+        names = [name for name in names if name in self._events and not self.is_ready(name)]
+        if not names:
+            return True
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*(self._events[name].wait() for name in names)), timeout
+            )
+        except asyncio.TimeoutError:
+            return False
+        return all(self.is_ready(name) for name in names)
+    
+    def snapshot(self) -> Dict[str, dict]:
+        return {name: dict(state) for name, state in self._subsystems.items()}
+
+# Global readiness tracker
+readiness = Readiness()
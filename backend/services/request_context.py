@@ -0,0 +1,98 @@
+import json
+import logging
+import uuid
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+from config import settings
+
+# Request ID of the request being handled by the current task
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+# Per-stage seconds collected for the Server-Timing header (None when disabled)
+stage_timings_var: ContextVar[Optional[Dict[str, float]]] = ContextVar("stage_timings", default=None)
+
+# (name, start perf_counter, seconds, task name) of each timed stage, for a profiled request
+stage_timeline_var: ContextVar[Optional[List[Tuple[str, float, float, str]]]] = ContextVar(
+    "stage_timeline", default=None
+)
+
+# Attributes every LogRecord has; anything else was passed through `extra=`
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+def mask_email(email: str) -> str:
+    """Keep the domain and first character only, e.g. j***@example.com"""
+    local, _, domain = (email or "").partition("@")
+    return f"{local[:1]}***@{domain}" if domain else "***"
+
+class RequestContextFilter(logging.Filter):
+    """Attach the current request ID to every log record"""
+    
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+class JsonLogFormatter(logging.Formatter):
+    """One JSON object per line, including request_id and any `extra` fields"""
+    
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and value is not None:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+def configure_logging(level: str, log_format: str):
+    handler = logging.StreamHandler()
+    handler.addFilter(RequestContextFilter())
+    if log_format == "json":
+        handler.setFormatter(JsonLogFormatter())
+    else:
+        handler.setFormatter(logging.Formatter("%(levelname)s:%(name)s:[%(request_id)s] %(message)s"))
+    logging.basicConfig(level=getattr(logging, level), handlers=[handler], force=True)
+
+class RequestIDMiddleware:
+    """ASGI middleware that assigns each request an ID (or reuses X-Request-ID)
+    and echoes it in the response headers, along with Server-Timing when enabled."""
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")[:64]
+                break
+        request_id = request_id or uuid.uuid4().hex
+        token = request_id_var.set(request_id)
+        timings = {} if settings.server_timing_enabled else None
+        timings_token = stage_timings_var.set(timings)
+        
+        async def send_with_request_id(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"x-request-id", request_id.encode("latin-1")))
+                if timings:
+                    server_timing = ", ".join(
+                        f"{name};dur={seconds * 1000:.3f}" for name, seconds in timings.items()
+                    )
+                    headers.append((b"server-timing", server_timing.encode("latin-1")))
+                message["headers"] = headers
+            await send(message)
+        
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            stage_timings_var.reset(timings_token)
+            request_id_var.reset(token)
@@ -0,0 +1,284 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Sequence, Tuple
+from config import settings
+from services import metrics
+
+logger = logging.getLogger(__name__)
+
+# Metric snapshot row holding the combined totals of workers that have exited
+RETIRED_WORKER_ID = "retired"
+
+def open_sqlite(path: str):
+    """Open a SQLite connection suited to concurrent use by several worker processes"""
+    import sqlite3
+    
+    conn = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+class SQLiteFile:
+    """This worker's connection to the host's shared SQLite file.
+    
+    Every store kept in the file (shared state, rate limit buckets) goes
+    through the one connection, and its calls are serialised on one thread
+    to keep them off the event loop.
+    """
+    
+    def __init__(self, path: str):
+        self.path = path
+        self.conn = open_sqlite(path)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite")
+    
+    async def call(self, method, *args):
+        return await asyncio.get_event_loop().run_in_executor(self._executor, method, *args)
+
+_sqlite_file: Optional[SQLiteFile] = None
+
+def shared_sqlite_file() -> SQLiteFile:
+    """The SQLite file at SHARED_STATE_PATH, opened once per process"""
+    global _sqlite_file
+    if _sqlite_file is None:
+        _sqlite_file = SQLiteFile(settings.shared_state_path)
+    return _sqlite_file
+
+class InMemorySharedStateStore:
+    """Cache entries and metric snapshots for a single process"""
+    
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+    
+    def get(self, namespace: str, key: str) -> Optional[dict]:
+        entry = self._entries.get((namespace, key))
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            del self._entries[(namespace, key)]
+            return None
+        return entry[1]
+    
+    def set(self, namespace: str, key: str, value: dict, ttl_seconds: float):
+        self._entries[(namespace, key)] = (time.monotonic() + ttl_seconds, value)
+        self._entries.move_to_end((namespace, key))
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+    
+    def publish_metrics(self, worker_id: str, snapshot: dict):
+        # A single process has nothing to merge with
+        pass
+    
+    def metric_snapshots(self) -> List[Tuple[dict, float]]:
+        return []
+    
+    def reset_metrics(self):
+        pass
+    
+    def retire_metrics(self, exited: Callable[[str, float], bool], fold: Callable[[Sequence[dict]], dict]) -> int:
+        return 0
+
+class SQLiteSharedStateStore:
+    """Cache entries and metric snapshots in a local SQLite file (WAL mode) shared by all workers"""
+    
+    SWEEP_INTERVAL = 60.0
+    
+    def __init__(self, file: SQLiteFile, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self.file = file
+        self._conn = file.conn
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS shared_cache ("
+            "namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, expires_at REAL NOT NULL, "
+            "PRIMARY KEY (namespace, key)) WITHOUT ROWID"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS metric_snapshots ("
+            "worker_id TEXT PRIMARY KEY, snapshot TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._next_sweep = 0.0
+    
+    def get(self, namespace: str, key: str) -> Optional[dict]:
+        row = self._conn.execute(
+            "SELECT value FROM shared_cache WHERE namespace = ? AND key = ? AND expires_at > ?",
+            (namespace, key, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+    
+    def set(self, namespace: str, key: str, value: dict, ttl_seconds: float):
+        now = time.time()
+        self._conn.execute(
+            "INSERT OR REPLACE INTO shared_cache (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+            (namespace, key, json.dumps(value), now + ttl_seconds)
+        )
+        if now >= self._next_sweep:
+            self._sweep(now)
+    
+    def _sweep(self, now: float):
+        self._next_sweep = now + self.SWEEP_INTERVAL
+        conn = self._conn
+        conn.execute("DELETE FROM shared_cache WHERE expires_at <= ?", (now,))
+        # Still over budget: drop the entries closest to expiry
+        overflow = conn.execute("SELECT COUNT(*) FROM shared_cache").fetchone()[0] - self.max_entries
+        if overflow > 0:
+            conn.execute(
+                "DELETE FROM shared_cache WHERE (namespace, key) IN ("
+                "SELECT namespace, key FROM shared_cache ORDER BY expires_at LIMIT ?)",
+                (overflow,)
+            )
+    
+    def publish_metrics(self, worker_id: str, snapshot: dict):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO metric_snapshots (worker_id, snapshot, updated_at) VALUES (?, ?, ?)",
+            (worker_id, json.dumps(snapshot), time.time())
+        )
+    
+    def metric_snapshots(self) -> List[Tuple[dict, float]]:
+        """(snapshot, updated_at) of every worker that has published, exited ones folded into one row"""
+        rows = self._conn.execute("SELECT snapshot, updated_at FROM metric_snapshots").fetchall()
+        return [(json.loads(snapshot), updated_at) for snapshot, updated_at in rows]
+    
+    def reset_metrics(self):
+        self._conn.execute("DELETE FROM metric_snapshots")
+    
+    def retire_metrics(self, exited: Callable[[str, float], bool], fold: Callable[[Sequence[dict]], dict]) -> int:
+        """Fold the snapshots of exited workers into the single retired row; returns how many were folded"""
+        conn = self._conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            workers = [
+                worker_id
+                for worker_id, updated_at in conn.execute("SELECT worker_id, updated_at FROM metric_snapshots")
+                if worker_id != RETIRED_WORKER_ID and exited(worker_id, updated_at)
+            ]
+            if workers:
+                placeholders = ",".join("?" * (len(workers) + 1))
+                rows = conn.execute(
+                    f"SELECT snapshot FROM metric_snapshots WHERE worker_id IN ({placeholders})",
+                    (RETIRED_WORKER_ID, *workers)
+                ).fetchall()
+                conn.execute(
+                    f"DELETE FROM metric_snapshots WHERE worker_id IN ({placeholders})",
+                    (RETIRED_WORKER_ID, *workers)
+                )
+                conn.execute(
+                    "INSERT INTO metric_snapshots (worker_id, snapshot, updated_at) VALUES (?, ?, ?)",
+                    (RETIRED_WORKER_ID, json.dumps(fold([json.loads(row[0]) for row in rows])), time.time())
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return len(workers)
+
+class SharedState:
+    """State shared by all worker processes on a host: moderation verdicts and metrics.
+    
+    With the sqlite backend every worker reads and writes the same WAL-mode
+    file, so a verdict cached by one worker is a hit in all of them and
+    /metrics reports totals across workers rather than those of whichever
+    worker answered the scrape.
+    """
+    
+    def __init__(self, store):
+        self.store = store
+        self.worker_id = str(os.getpid())
+        self._sqlite: Optional[SQLiteFile] = store.file if isinstance(store, SQLiteSharedStateStore) else None
+        self._publish_task = None
+    
+    @property
+    def shared(self) -> bool:
+        return self._sqlite is not None
+    
+    async def _call(self, method, *args):
+        if self._sqlite is None:
+            return method(*args)
+        return await self._sqlite.call(method, *args)
+    
+    async def get(self, namespace: str, key: str) -> Optional[dict]:
+        return await self._call(self.store.get, namespace, key)
+    
+    async def set(self, namespace: str, key: str, value: dict, ttl_seconds: float):
+        await self._call(self.store.set, namespace, key, value, ttl_seconds)
+    
+    async def publish_metrics(self):
+        """Store this worker's current metric values for the other workers to merge"""
+        await self._call(self.store.publish_metrics, self.worker_id, metrics.registry.snapshot())
+    
+    async def render_metrics(self) -> str:
+        """Prometheus text for all workers on the host (or just this one without sharing)"""
+        if not self.shared:
+            return metrics.registry.render()
+        await self.publish_metrics()
+        # Counters of exited workers still count; their gauges are stale and dropped
+        live_after = time.time() - 3 * settings.shared_state_publish_interval_seconds
+        snapshots = await self._call(self.store.metric_snapshots)
+        return metrics.registry.render([
+            (snapshot, updated_at >= live_after) for snapshot, updated_at in snapshots
+        ])
+    
+    async def retire_exited_workers(self):
+        """Fold the metrics of workers that have exited so their rows do not pile up across restarts"""
+        stale_before = time.time() - 3 * settings.shared_state_publish_interval_seconds
+        
+        def exited(worker_id: str, updated_at: float) -> bool:
+            # A stalled but running worker keeps its row; it would publish its totals again
+            pid = worker_id.split("-")[0]
+            return updated_at < stale_before and pid.isdigit() and not _process_running(int(pid))
+        
+        retired = await self._call(self.store.retire_metrics, exited, metrics.registry.fold)
+        if retired:
+            logger.info(f"Folded metrics of {retired} exited worker(s) into the retired totals")
+    
+    def start(self):
+        if self.shared:
+            # Worker IDs are per start so a recycled PID never overwrites another worker's totals
+            self.worker_id = f"{os.getpid()}-{time.time():.0f}"
+            self._publish_task = asyncio.create_task(self._publish_loop())
+    
+    async def stop(self):
+        if self._publish_task:
+            self._publish_task.cancel()
+            try:
+                await self._publish_task
+            except asyncio.CancelledError:
+                pass
+            self._publish_task = None
+            await self.publish_metrics()
+    
+    async def _publish_loop(self):
+        while True:
+            try:
+                await self.retire_exited_workers()
+            except Exception as e:
+                logger.warning(f"Failed to retire exited workers' metrics: {e}")
+            await asyncio.sleep(settings.shared_state_publish_interval_seconds)
+            try:
+                await self.publish_metrics()
+            except Exception as e:
+                logger.warning(f"Failed to publish metrics to shared state: {e}")
+
+def _process_running(pid: int) -> bool:
+    if os.name == "nt":
+        # os.kill would terminate the process on Windows
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def create_shared_state() -> SharedState:
+    if settings.shared_state_backend == "sqlite":
+        return SharedState(SQLiteSharedStateStore(shared_sqlite_file(), settings.shared_state_max_entries))
+    return SharedState(InMemorySharedStateStore(settings.shared_state_max_entries))
+
+# Global shared state instance
+shared_state = create_shared_state()
@@ -1,18 +1,22 @@
 import re
-import phonenumbers
-from phonenumbers import NumberParseException
 from email_validator import validate_email, EmailNotValidError
 from typing import Tuple, Optional
+from config import settings
 
 class ValidationService:
     """Service for validating user input data"""
     
+    @staticmethod
+    def preload():
+        """Import phonenumbers (and its metadata) ahead of the first request"""
+        import phonenumbers
+    
     @staticmethod
     def validate_email_format(email: str) -> Tuple[bool, str]:
         """Validate email format"""
         try:
             # Validate and get normalized result
-            valid = validate_email(email)
+            valid = validate_email(email, check_deliverability=settings.email_check_deliverability)
             return True, valid.email
         except EmailNotValidError as e:
             return False, str(e)
@@ -23,6 +27,9 @@ class ValidationService:
         if not phone:
             return True, ""  # Phone is optional
         
+        import phonenumbers
+        from phonenumbers import NumberParseException
+        
         try:
             # Remove any non-digit characters except +
             cleaned_phone = re.sub(r'[^\d+]', '', phone)
@@ -11,9 +11,12 @@ const api = axios.create({
 });
 
 export const contactService = {
-  async submitContact(data: ContactFormData): Promise<ApiResponse> {
+  async submitContact(data: ContactFormData, idempotencyKey?: string): Promise<ApiResponse> {
     try {
-      const response = await api.post('/api/contact', data);
+      // Without a key the backend deduplicates on the email and message instead
+      const response = await api.post('/api/contact', data, {
+        headers: idempotencyKey ? { 'Idempotency-Key': idempotencyKey } : undefined,
+      });
       return response.data;
     } catch (error) {
       if (axios.isAxiosError(error) && error.response) {
@@ -1,4 +1,4 @@
-import React, { useState } from 'react';
+import React, { useRef, useState } from 'react';
 import { motion } from 'framer-motion';
 import { useForm } from 'react-hook-form';
 import { ContactFormData } from '../types';
@@ -9,6 +9,8 @@ const ContactForm: React.FC = () => {
   const [isSubmitting, setIsSubmitting] = useState(false);
   const [submitStatus, setSubmitStatus] = useState<'idle' | 'success' | 'error'>('idle');
   const [submitMessage, setSubmitMessage] = useState('');
+  // Idempotency key of the pending submission, reused when the same data is sent again
+  const pendingSubmission = useRef<{ key: string; payload: string } | null>(null);
 
   const {
     register,
@@ -29,10 +31,17 @@ const ContactForm: React.FC = () => {
     setIsSubmitting(true);
     setSubmitStatus('idle');
 
+    const payload = JSON.stringify(data);
+    if (pendingSubmission.current?.payload !== payload) {
+      pendingSubmission.current = { key: crypto.randomUUID(), payload };
+    }
+    const { key } = pendingSubmission.current;
+
     try {
-      const result = await contactService.submitContact(data);
+      const result = await contactService.submitContact(data, key);
       
       if (result.success) {
+        pendingSubmission.current = null;
         setSubmitStatus('success');
         setSubmitMessage(result.message || 'Message sent successfully!');
         reset();